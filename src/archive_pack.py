@@ -0,0 +1,222 @@
+import hashlib
+import os
+import shutil
+import socket
+import struct
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime
+from snapshot import SNAPSHOT_PATTERN
+
+# offset da entrada no .pack, tamanho dos dados, tamanhos do nome e do motivo, horário da captura,
+# hash do nome, câmera, decisão. Nome e motivo completos ficam no .pack, logo antes dos dados
+RECORD = struct.Struct("<QIHHd16s32s16s")
+
+PackEntry = namedtuple("PackEntry", ["offset", "length", "captured_at", "camera", "decision", "reason", "filename"])
+
+def encode(text, size):
+    return (text or "").encode("utf-8")[:size]
+
+def decode(data):
+    return data.rstrip(b"\0").decode("utf-8", errors="ignore")
+
+def name_digest(filename):
+    return hashlib.blake2b(filename.encode("utf-8"), digest_size=16).digest()
+
+def describe(filename):
+    # Câmera, horário e dia da captura vêm do nome do snapshot; sem padrão, fica o horário do arquivamento
+    match = SNAPSHOT_PATTERN.match(filename)
+    if match:
+        try:
+            return match.group(3), datetime.strptime(match.group(1), "%Y%m%d-%H%M%S").timestamp(), match.group(1)[:8]
+        except ValueError:
+            pass
+    return "", time.time(), None
+
+def pack_paths(archive_path, day, station):
+    # Um par de arquivos por estação: cada processo só acrescenta nos seus, sem lock no compartilhamento
+    name = f"{day}-{station}"
+    return os.path.join(archive_path, f"{name}.pack"), os.path.join(archive_path, f"{name}.idx")
+
+def read_keys(index_path):
+    # (hash do nome, tamanho) de cada entrada; basta o índice, sem ler o .pack
+    keys = set()
+    with open(index_path, "rb") as f:
+        for record in iter(lambda: f.read(RECORD.size), b""):
+            if len(record) == RECORD.size:
+                _, length, _, _, _, digest, _, _ = RECORD.unpack(record)
+                keys.add((digest, length))
+    return keys
+
+class DailyPack:
+    # Um par .pack (bytes dos snapshots, só acrescentados) + .idx (registros de tamanho fixo)
+    def __init__(self, archive_path, day, station):
+        self.day = day
+        os.makedirs(archive_path, exist_ok=True)
+        pack_path, index_path = pack_paths(archive_path, day, station)
+        self.index_name = os.path.basename(index_path)
+        self.pack = open(pack_path, "ab")
+        self.index = open(index_path, "a+b")
+        # Registro incompleto no fim do índice (queda no meio da escrita) é descartado
+        size = self.index.seek(0, os.SEEK_END)
+        whole = size - size % RECORD.size
+        if whole != size:
+            self.index.truncate(whole)
+        self.keys = read_keys(index_path)
+        self.count = whole // RECORD.size
+
+    def append(self, source, filename, decision, reason=None):
+        # source já aberto pelo chamador: um original que sumiu não deixa lixo no .pack
+        camera, captured_at, _ = describe(filename)
+        name = filename.encode("utf-8")
+        reason_bytes = (reason or "").encode("utf-8")[:0xFFFF]
+        offset = self.pack.seek(0, os.SEEK_END)
+        self.pack.write(name + reason_bytes)
+        shutil.copyfileobj(source, self.pack)
+        length = self.pack.tell() - offset - len(name) - len(reason_bytes)
+        digest = name_digest(filename)
+        self.index.write(RECORD.pack(offset, length, len(name), len(reason_bytes), captured_at, digest, encode(camera, 32), encode(decision, 16)))
+        self.keys.add((digest, length))
+        self.count += 1
+        return self.count - 1
+
+    def sync(self):
+        # Os dados vão para o disco antes do índice que aponta para eles
+        self.pack.flush()
+        os.fsync(self.pack.fileno())
+        self.index.flush()
+        os.fsync(self.index.fileno())
+
+    def close(self):
+        self.pack.close()
+        self.index.close()
+
+class ArchivePacker:
+    def __init__(self, archive_path, station=None):
+        self.archive_path = archive_path
+        self.station = station or socket.gethostname()
+        self.current = None
+        # Chaves dos índices fechados (dias anteriores, outras estações), lidas uma vez
+        self.known = {}
+        # Nomes dos índices do arquivo, listados uma vez por dia e não a cada lote
+        self.indexes = None
+        self.listed_day = None
+
+    def open_day(self, day):
+        if self.current is None or self.current.day != day:
+            if self.current is not None:
+                self.current.close()
+            self.current = DailyPack(self.archive_path, day, self.station)
+        return self.current
+
+    def list_indexes(self, day):
+        # A listagem cresce com o histórico; um índice criado depois dela só deixa passar uma entrada repetida
+        if self.listed_day != day:
+            self.indexes = [entry.name for entry in os.scandir(self.archive_path) if entry.name.endswith(".idx")]
+            self.listed_day = day
+        if self.current.index_name not in self.indexes:
+            self.indexes.append(self.current.index_name)
+        return self.indexes
+
+    def packed_before(self, filename, size, indexes):
+        # Um snapshot só pode ter sido empacotado do dia da captura em diante; nome e tamanho precisam bater
+        key = (name_digest(filename), size)
+        first_day = describe(filename)[2] or self.current.day
+        for index_name in indexes:
+            if index_name[:8] < first_day:
+                continue
+            if index_name == self.current.index_name:
+                keys = self.current.keys
+            else:
+                keys = self.known.get(index_name)
+                if keys is None:
+                    keys = self.known[index_name] = read_keys(os.path.join(self.archive_path, index_name))
+            if key in keys:
+                return True
+        return False
+
+    def pack(self, items):
+        # items: (caminho, decisão, motivo). Um fsync por lote; os originais só saem depois dele.
+        # Retorna (falhas, ausentes): um original que já não está na pasta conta como feito
+        try:
+            day = time.strftime("%Y%m%d")
+            daily = self.open_day(day)
+            indexes = self.list_indexes(day)
+        except OSError:
+            return [path for path, _, _ in items], []
+        packed, failed, missing = [], [], []
+        for path, decision, reason in items:
+            try:
+                # Uma abertura por original: o tamanho vem do handle, sem stat à parte
+                with open(path, "rb") as source:
+                    filename = os.path.basename(path)
+                    if not self.packed_before(filename, os.fstat(source.fileno()).st_size, indexes):
+                        daily.append(source, filename, decision, reason)
+                # Se já estava, foi empacotado antes de uma queda; falta só remover
+                packed.append(path)
+            except FileNotFoundError:
+                missing.append(path)  # Já saiu da pasta (outra estação, ou removido antes de uma queda)
+            except OSError:
+                failed.append(path)
+        if packed:
+            try:
+                daily.sync()
+            except OSError:
+                self.close()
+                return [path for path, _, _ in items], []
+        for path in packed:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                failed.append(path)
+        return failed, missing
+
+    def close(self):
+        if self.current is not None:
+            self.current.close()
+            self.current = None
+
+def day_stations(archive_path, day):
+    return sorted(name[len(day) + 1:-4] for name in os.listdir(archive_path) if name.startswith(f"{day}-") and name.endswith(".idx"))
+
+def entry_count(archive_path, day, station):
+    _, index_path = pack_paths(archive_path, day, station)
+    return os.path.getsize(index_path) // RECORD.size
+
+def read_entry(archive_path, day, station, number, with_data=True):
+    # Acesso direto pelo número da entrada: um seek no índice e um no pack
+    pack_path, index_path = pack_paths(archive_path, day, station)
+    if number < 0:
+        raise IndexError(f"no entry {number} in {index_path}")
+    with open(index_path, "rb") as f:
+        f.seek(number * RECORD.size)
+        record = f.read(RECORD.size)
+    if len(record) < RECORD.size:
+        raise IndexError(f"no entry {number} in {index_path}")
+    offset, length, name_length, reason_length, captured_at, _, camera, decision = RECORD.unpack(record)
+    with open(pack_path, "rb") as f:
+        f.seek(offset)
+        header = f.read(name_length + reason_length)
+        data = f.read(length) if with_data else None
+    entry = PackEntry(offset, length, captured_at, decode(camera), decode(decision), decode(header[name_length:]), decode(header[:name_length]))
+    return entry, data
+
+if __name__ == "__main__":
+    from config import ARCHIVE_PATH
+    day = sys.argv[1]
+    if len(sys.argv) < 4:
+        for station in day_stations(ARCHIVE_PATH, day):
+            if len(sys.argv) == 3 and station != sys.argv[2]:
+                continue
+            for number in range(entry_count(ARCHIVE_PATH, day, station)):
+                entry, _ = read_entry(ARCHIVE_PATH, day, station, number, with_data=False)
+                print(station, number, f"{datetime.fromtimestamp(entry.captured_at):%Y-%m-%d %H:%M:%S}", entry.camera, entry.decision, entry.reason, entry.filename)
+    else:
+        entry, data = read_entry(ARCHIVE_PATH, day, sys.argv[2], int(sys.argv[3]))
+        output = sys.argv[4] if len(sys.argv) > 4 else entry.filename
+        with open(output, "wb") as f:
+            f.write(data)
+        print(f"{entry.filename} -> {output}")
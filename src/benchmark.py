@@ -0,0 +1,253 @@
+import http.server
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlparse, parse_qs
+from camera_map import CameraMap
+from config import STREAM_PREWARM
+from file_actions import DELETE
+from folder_monitor import FolderMonitor
+from pipeline import EventPipeline
+from snapshot import DEF_FLAG
+from stream_pool import StreamPool
+
+SCREEN_SIZE = (1280, 720)
+FRAME_SIZE = (640, 360)
+
+def make_frames(count, size=FRAME_SIZE):
+    import cv2
+    import numpy as np
+    rng = np.random.default_rng(0)
+    frames = []
+    for i in range(count):
+        img = rng.integers(0, 255, (size[1] // 8, size[0] // 8, 3), dtype=np.uint8)
+        img = cv2.resize(img, size, interpolation=cv2.INTER_NEAREST)
+        cv2.putText(img, str(i), (20, size[1] - 20), cv2.FONT_HERSHEY_SIMPLEX, 3, (255, 255, 255), 6)
+        frames.append(cv2.imencode(".jpg", img)[1].tobytes())
+    return frames
+
+def camera_name(number):
+    return f"Cam{number:02d}"
+
+def snapshot_name(timestamp, camera, sequence, is_def):
+    flag = f" {DEF_FLAG}" if is_def else ""
+    return f"{timestamp:%Y%m%d-%H%M%S}_10.0.0.{camera}_{camera_name(camera)}{flag}_{sequence:04d}.jpg"
+
+class SnapshotGenerator:
+    # Gera snapshots no formato real; arquivos ao vivo usam temporário + rename como o FTP
+    def __init__(self, path, frames, cameras, def_ratio):
+        self.path = path
+        self.frames = frames
+        self.cameras = cameras
+        self.def_ratio = def_ratio
+        self.clock = datetime(2024, 1, 1)
+        self.sequence = 0
+        self.written = {}
+
+    def write(self, temporary=False):
+        self.sequence += 1
+        self.clock += timedelta(seconds=random.randint(1, 90))
+        name = snapshot_name(self.clock, random.randint(1, self.cameras), self.sequence % 10000, random.random() < self.def_ratio)
+        path = os.path.join(self.path, name)
+        target = f"{path}.part" if temporary else path
+        with open(target, "wb") as f:
+            f.write(random.choice(self.frames))
+        if temporary:
+            os.replace(target, path)
+            self.written[path] = time.perf_counter()
+        else:
+            # Backlog já estava na pasta: fora da janela de upload do FolderMonitor
+            past = time.time() - 3600
+            os.utime(path, (past, past))
+        return path
+
+    def backlog(self, count):
+        for _ in range(count):
+            self.write()
+
+    def live(self, count, rate):
+        for _ in range(count):
+            self.write(temporary=True)
+            time.sleep(1 / rate)
+
+def make_server(cameras, frames, fps=15):
+    names = "&".join(f"{number}={camera_name(number)}.cam" for number in range(1, cameras + 1))
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path.endswith("camerasnomes.cgi"):
+                body = names.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            elif url.path.endswith("mjpegstream.cgi"):
+                camera = int(parse_qs(url.query).get("camera", ["1"])[0])
+                self.send_response(200)
+                self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+                self.end_headers()
+                i = camera
+                try:
+                    while True:
+                        frame = frames[i % len(frames)]
+                        i += 1
+                        self.wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n" % len(frame) + frame + b"\r\n")
+                        time.sleep(1 / fps)
+                except OSError:
+                    pass
+            else:
+                self.send_error(404)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def summarize(values):
+    return {name: round(1000 * percentile(values, fraction), 1) if values else None for name, fraction in (("p50_ms", 0.5), ("p90_ms", 0.9), ("p99_ms", 0.99))}
+
+class HeadlessPipeline:
+    # O EventPipeline do MainGUI (supressão, pré-filtro, rajadas, fila, cache, decisão) sem o Tk;
+    # o benchmark só substitui a tela por um operador roteirizado
+    def __init__(self, folder, workdir, base_url):
+        camera_map = CameraMap(url=f"{base_url}/camerasnomes.cgi", auth=None, cache_path=os.path.join(workdir, "camera_map.json"))
+        camera_map.refresh()
+        self.pipeline = EventPipeline(SCREEN_SIZE, camera_map, journal_path=os.path.join(workdir, "events.db"), archive_path=os.path.join(workdir, "arquivo"), action_journal=os.path.join(workdir, "actions.journal"))
+        self.image_queue = self.pipeline.image_queue
+        self.snapshot_cache = self.pipeline.snapshot_cache
+        self.stream_pool = StreamPool(url_template=f"{base_url}/mjpegstream.cgi?camera={{camera}}")
+        self.monitor = FolderMonitor(folder, self.accept_image, on_ready=self.on_backlog_indexed)
+        self.accepted = 0
+        self.started = None
+        self.indexed = None
+
+    def accept_image(self, image_path):
+        self.accepted += 1
+        self.pipeline.enqueue_image(image_path)
+
+    def on_backlog_indexed(self):
+        self.indexed = time.perf_counter()
+        self.pipeline.on_backlog_indexed(self.monitor.index)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.pipeline.start()
+        self.monitor.start()
+
+    def switch_stream(self, camera_number):
+        # Tempo até o primeiro quadro novo depois de trocar de câmera
+        started = time.perf_counter()
+        stream = self.stream_pool.acquire(camera_number, None)
+        with stream.latest_frame() as (_, seq):
+            current = seq
+        while current == seq and time.perf_counter() - started < 5:
+            time.sleep(0.002)
+            with stream.latest_frame() as (_, current):
+                pass
+        return time.perf_counter() - started if current != seq else None
+
+    def operate(self, total, think_time, written, stop_event):
+        # Operador roteirizado: exibe, espera, decide "Sem motivo aparente"
+        latencies, switches, handled = [], [], 0
+        while handled < total and not stop_event.is_set():
+            event = self.pipeline.next_event(block=True, timeout=0.5)
+            if event is None:
+                continue
+            self.snapshot_cache.get(event.path)
+            displayed = time.perf_counter()
+            self.pipeline.displayed(event)
+            if event.path in written:
+                latencies.append(displayed - written[event.path])
+            if event.camera_number:
+                switch = self.switch_stream(event.camera_number)
+                if switch is not None:
+                    switches.append(switch)
+            upcoming = self.image_queue.peek(STREAM_PREWARM)
+            self.stream_pool.prewarm([e.camera_number for e in upcoming if e.camera_number])
+            time.sleep(think_time)
+            handled += len(self.pipeline.resolve(DELETE))
+        return latencies, switches, handled
+
+    def close(self):
+        self.monitor.stop()
+        self.stream_pool.close_all()
+        self.pipeline.close()
+
+def peak_memory_mb():
+    try:
+        import resource
+    except ImportError:
+        return None  # Windows: sem getrusage
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def run(backlog=2000, live=200, rate=20, cameras=8, def_ratio=0.1, think_time=0.01):
+    workdir = tempfile.mkdtemp(prefix="benchmark-")
+    folder = os.path.join(workdir, "0000")
+    os.makedirs(folder)
+    frames = make_frames(16)
+    server = make_server(cameras, frames)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    generator = SnapshotGenerator(folder, frames, cameras, def_ratio)
+    generator.backlog(backlog)
+    pipeline = HeadlessPipeline(folder, workdir, base_url)
+    stop_event = threading.Event()
+    results = {}
+    cpu_started, started = time.process_time(), time.perf_counter()
+    drained = started
+    try:
+        pipeline.start()
+        operator = threading.Thread(target=lambda: results.update(zip(("latencies", "switches", "handled"), pipeline.operate(backlog + live, think_time, generator.written, stop_event))))
+        operator.start()
+        # Arquivos ao vivo só começam com o backlog esvaziado, para medir a latência de um evento novo
+        while (pipeline.indexed is None or not pipeline.image_queue.empty()) and operator.is_alive():
+            time.sleep(0.05)
+        drained = time.perf_counter()
+        generator.live(live, rate)
+        operator.join(timeout=max(60, (backlog + live) * (think_time + 0.2)))
+        stop_event.set()
+        operator.join()
+    finally:
+        elapsed = time.perf_counter() - started
+        cpu = time.process_time() - cpu_started
+        pipeline.close()
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+    ingest_span = pipeline.indexed - pipeline.started if pipeline.indexed else None
+    return {
+        "events": backlog + live,
+        "accepted": pipeline.accepted,
+        "handled": results.get("handled", 0),
+        "backlog_ingest_s": round(ingest_span, 3) if ingest_span else None,
+        "ingest_events_per_s": round(backlog / ingest_span, 1) if ingest_span else None,
+        "backlog_drain_s": round(drained - started, 2),
+        "event_to_display": summarize(results.get("latencies", [])),
+        "stream_switch": summarize(results.get("switches", [])),
+        "elapsed_s": round(elapsed, 2),
+        "cpu_s": round(cpu, 2),
+        "cpu_percent": round(100 * cpu / elapsed, 1) if elapsed else None,
+        "peak_memory_mb": peak_memory_mb(),
+    }
+
+if __name__ == "__main__":
+    from logger import setup_logger
+    setup_logger()
+    arguments = [int(value) for value in sys.argv[1:4]]
+    for name, value in run(*arguments).items():
+        print(f"{name}: {value}")
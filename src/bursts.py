@@ -0,0 +1,142 @@
+import threading
+from array import array
+from config import BURST_WINDOW, BURST_MAX_DISTANCE
+from logger import get_logger
+
+NO_HASH = 0
+
+def dhash(path):
+    # Hash de diferença de 64 bits sobre a imagem reduzida a 9x8
+    import cv2
+    import numpy as np
+    gray = cv2.imread(path, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if gray is None:
+        return NO_HASH
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = np.packbits(small[:, 1:] > small[:, :-1])
+    return int.from_bytes(bits.tobytes(), "big") or 1
+
+class HashIndex:
+    def __init__(self):
+        self.hashes = array("Q")
+        self.slots = {}
+        self.free = []
+        self.lock = threading.Lock()
+
+    def get(self, path, read=True):
+        # Sem read, só o que já está calculado; None se precisaria ler a imagem
+        with self.lock:
+            slot = self.slots.get(path)
+            if slot is not None:
+                return self.hashes[slot]
+        if not read:
+            return None
+        value = dhash(path)
+        with self.lock:
+            if path not in self.slots:
+                if self.free:
+                    slot = self.free.pop()
+                    self.hashes[slot] = value
+                else:
+                    slot = len(self.hashes)
+                    self.hashes.append(value)
+                self.slots[path] = slot
+        return value
+
+    def discard(self, path):
+        with self.lock:
+            slot = self.slots.pop(path, None)
+            if slot is not None:
+                self.hashes[slot] = NO_HASH
+                self.free.append(slot)
+
+class Burst:
+    __slots__ = ("leader", "members", "last_time")
+
+    def __init__(self, event):
+        self.leader = event
+        self.members = [event]
+        self.last_time = event.epoch
+
+class BurstGrouper:
+    def __init__(self, window=BURST_WINDOW, max_distance=BURST_MAX_DISTANCE):
+        self.window = window
+        self.max_distance = max_distance
+        self.logger = get_logger()
+        self.hashes = HashIndex()
+        # Última rajada aberta de cada câmera, todas as rajadas pendentes pelo líder e a rajada de cada membro anexado
+        self.open = {}
+        self.bursts = {}
+        self.joined = {}
+        self.lock = threading.Lock()
+
+    def similar(self, a, b, read=True):
+        if self.max_distance is None:
+            return True
+        hash_a, hash_b = self.hashes.get(a.path, read), self.hashes.get(b.path, read)
+        if hash_a in (None, NO_HASH) or hash_b in (None, NO_HASH):
+            return False
+        return (hash_a ^ hash_b).bit_count() <= self.max_distance
+
+    def candidate(self, event):
+        # Rajada aberta na janela que pode receber o evento. Um DEF nunca entra
+        # numa rajada comum: perderia a prioridade na fila e abre a sua própria
+        if not event.parsed:
+            return None
+        with self.lock:
+            burst = self.open.get(event.camera_name)
+        if burst is not None and (burst.leader.is_def or not event.is_def) and abs(event.epoch - burst.last_time) <= self.window:
+            return burst
+        return None
+
+    def needs_hash(self, event):
+        # Decidir a rajada deste evento vai ler imagens: o chamador deve fazê-lo fora da thread de ingestão
+        return self.max_distance is not None and self.candidate(event) is not None
+
+    def add(self, event, read=True):
+        # Retorna a rajada à qual o evento foi anexado, ou None se ele inicia uma nova.
+        # Só calcula hashes quando há rajada candidata; sem read, nunca lê imagens
+        if event.parsed:
+            burst = self.candidate(event)
+            if burst is not None and self.similar(burst.members[-1], event, read):
+                with self.lock:
+                    if self.open.get(event.camera_name) is burst:
+                        burst.members.append(event)
+                        burst.last_time = max(burst.last_time, event.epoch)
+                        self.joined[event.path] = burst
+                        return burst
+        burst = Burst(event)
+        with self.lock:
+            if event.parsed:
+                self.open[event.camera_name] = burst
+            self.bursts[event.path] = burst
+        return None
+
+    def members(self, leader_path):
+        with self.lock:
+            burst = self.bursts.get(leader_path)
+            return list(burst.members) if burst else []
+
+    def resolve(self, leader):
+        with self.lock:
+            burst = self.bursts.pop(leader.path, None)
+            if burst is None:
+                return [leader]
+            if self.open.get(leader.camera_name) is burst:
+                del self.open[leader.camera_name]
+            members = list(burst.members)
+            for event in members[1:]:
+                self.joined.pop(event.path, None)
+        for event in members:
+            self.hashes.discard(event.path)
+        return members
+
+    def discard_member(self, path):
+        # Tira da rajada um membro que não é o líder; False se o caminho não está anexado a nenhuma
+        with self.lock:
+            burst = self.joined.pop(path, None)
+            if burst is None:
+                return False
+            burst.members = [event for event in burst.members if event.path != path]
+        self.hashes.discard(path)
+        return True
@@ -0,0 +1,140 @@
+import json
+import os
+import random
+import threading
+import time
+from config import CAMERA_NAMES_URL, CAMERA_AUTH, HTTP_TIMEOUT, CAMERA_MAP_CACHE, CAMERA_MAP_TTL, CAMERA_MAP_MIN_REFRESH
+from logger import get_logger
+from metrics import get_metrics
+
+RETRY_BASE_DELAY = 5
+
+class CameraMap:
+    def __init__(self, url=CAMERA_NAMES_URL, auth=CAMERA_AUTH, cache_path=CAMERA_MAP_CACHE, ttl=CAMERA_MAP_TTL, min_refresh_interval=CAMERA_MAP_MIN_REFRESH):
+        self.url = url
+        self.auth = auth
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.logger = get_logger()
+        # Substituído inteiro a cada atualização; leituras não precisam de lock
+        self.names = {}
+        self.fetched_at = 0
+        self.listeners = []
+        self.session = None
+        self.last_request = 0
+        self.wake = threading.Event()
+        self.stop_event = threading.Event()
+
+    def __len__(self):
+        return len(self.names)
+
+    def get(self, name, default=None):
+        return self.names.get(name, default)
+
+    def lookup(self, name):
+        number = self.names.get(name)
+        if number is None:
+            self.logger.warning(f"Unknown camera name: {name}")
+            self.request_refresh()
+        return number
+
+    def expired(self):
+        return time.time() - self.fetched_at > self.ttl
+
+    def start(self):
+        self.load()
+        threading.Thread(target=self.refresh_loop, daemon=True).start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.wake.set()
+
+    def request_refresh(self):
+        now = time.monotonic()
+        if now - self.last_request >= self.min_refresh_interval:
+            self.last_request = now
+            self.wake.set()
+
+    def load(self):
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.names = data["cameras"]
+            self.fetched_at = data["fetched_at"]
+            self.logger.info(f"Loaded {len(self.names)} cameras from cache: {self.cache_path}")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as e:
+            self.logger.error(f"Error reading camera cache: {e}")
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"fetched_at": self.fetched_at, "cameras": self.names}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.cache_path)
+
+    def get_session(self):
+        if self.session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+            self.session = requests.Session()
+            retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504))
+            self.session.mount("http://", HTTPAdapter(max_retries=retry))
+            self.session.mount("https://", HTTPAdapter(max_retries=retry))
+            self.session.auth = self.auth
+        return self.session
+
+    def parse(self, text):
+        names = {}
+        for pair in text.split("&"):
+            if "=" in pair:
+                number, name = pair.split("=", 1)
+                camera_name = name.split(".")[0] if "." in name else name
+                names[camera_name] = number
+        return names
+
+    def refresh(self):
+        try:
+            with get_metrics().timer("camera_names_http"):
+                response = self.get_session().get(self.url, timeout=HTTP_TIMEOUT)
+            response.raise_for_status()
+            names = self.parse(response.text)
+        except Exception as e:
+            self.logger.error(f"Error fetching API data: {e}")
+            get_metrics().increment("camera_names_errors")
+            return False
+        added = names.keys() - self.names.keys()
+        self.names = names
+        self.fetched_at = time.time()
+        for camera_name in added:
+            self.logger.info(f"Parsed camera: {camera_name} = {names[camera_name]}")
+        try:
+            self.save()
+        except OSError as e:
+            self.logger.error(f"Error writing camera cache: {e}")
+        for listener in self.listeners:
+            # Uma falha em quem escuta não pode derrubar a thread de atualização
+            try:
+                listener()
+            except Exception as e:
+                self.logger.error(f"Error in camera map listener: {e}")
+        return True
+
+    def refresh_loop(self):
+        delay = max(0, self.ttl - (time.time() - self.fetched_at))
+        failures = 0
+        while not self.stop_event.is_set():
+            self.wake.wait(delay)
+            self.wake.clear()
+            if self.stop_event.is_set():
+                break
+            self.last_request = time.monotonic()
+            if self.refresh():
+                failures = 0
+                delay = self.ttl
+            else:
+                failures += 1
+                delay = min(self.ttl, RETRY_BASE_DELAY * 2 ** failures) * random.uniform(0.5, 1.0)
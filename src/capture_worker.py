@@ -0,0 +1,248 @@
+import logging
+import logging.handlers
+import multiprocessing
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+from config import CAPTURE_MAX_FRAME, CAPTURE_RESTART_BASE, CAPTURE_RESTART_MAX
+from logger import get_logger
+from video_stream import VideoStream, STATES, CLOSED
+
+# Cabeçalho publicado sob seqlock: versão (ímpar durante a escrita), (slot, altura, largura, seq)
+VERSION = struct.Struct("<Q")
+FIELDS = struct.Struct("<IIIQ")
+# Versão de cada slot: 2 * seq - 1 enquanto os pixels do quadro seq são copiados, 2 * seq depois
+SLOT_VERSION = struct.Struct("<Q")
+# Estado, reconexões, fps e horário do último quadro, escritos pelo processo de captura
+STATUS = struct.Struct("<IIdd")
+FIELDS_OFFSET = VERSION.size
+SLOT_VERSIONS_OFFSET = FIELDS_OFFSET + FIELDS.size
+STATUS_OFFSET = SLOT_VERSIONS_OFFSET + 2 * SLOT_VERSION.size
+SLOTS_OFFSET = STATUS_OFFSET + STATUS.size
+STABLE_RUN = 60
+READ_ATTEMPTS = 1000
+# Controle compartilhado: largura e altura alvo, pedido de parada.
+# Um multiprocessing.Event pode travar no set() depois que um processo que esperava nele é morto
+TARGET_WIDTH, TARGET_HEIGHT, STOP_REQUESTED = range(3)
+
+# spawn em todas as plataformas: fork com threads do cv2 ativas não é seguro
+_context = multiprocessing.get_context("spawn")
+_log_queue = None
+_log_listener = None
+
+class FrameBuffer:
+    # Buffer duplo em memória compartilhada: a captura escreve em um slot enquanto a interface lê o outro
+    def __init__(self, name=None, max_size=CAPTURE_MAX_FRAME):
+        width, height = max_size
+        self.max_size = max_size
+        self.slot_bytes = width * height * 3
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=SLOTS_OFFSET + 2 * self.slot_bytes)
+            self.shm.buf[:SLOTS_OFFSET] = bytes(SLOTS_OFFSET)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.closed = False
+        self.slots = [np.ndarray((self.slot_bytes,), dtype=np.uint8, buffer=self.shm.buf, offset=SLOTS_OFFSET + i * self.slot_bytes) for i in (0, 1)]
+
+    def view(self, slot, width, height):
+        return self.slots[slot][:width * height * 3].reshape(height, width, 3)
+
+    def slot_version(self, slot):
+        return SLOT_VERSION.unpack_from(self.shm.buf, SLOT_VERSIONS_OFFSET + slot * SLOT_VERSION.size)[0]
+
+    def begin_write(self, seq):
+        # O slot do quadro seq é seq % 2; a versão ímpar invalida leitores desse slot antes da cópia
+        slot = seq % 2
+        SLOT_VERSION.pack_into(self.shm.buf, SLOT_VERSIONS_OFFSET + slot * SLOT_VERSION.size, 2 * seq - 1)
+        return slot
+
+    def commit(self, seq, width, height):
+        slot = seq % 2
+        SLOT_VERSION.pack_into(self.shm.buf, SLOT_VERSIONS_OFFSET + slot * SLOT_VERSION.size, 2 * seq)
+        version, = VERSION.unpack_from(self.shm.buf, 0)
+        VERSION.pack_into(self.shm.buf, 0, version + 1)
+        FIELDS.pack_into(self.shm.buf, FIELDS_OFFSET, slot, height, width, seq)
+        VERSION.pack_into(self.shm.buf, 0, version + 2)
+
+    def latest(self):
+        if self.closed:
+            return None, 0
+        # Tentativas limitadas: se a captura morrer no meio de uma escrita, a versão fica ímpar
+        for _ in range(READ_ATTEMPTS):
+            version, = VERSION.unpack_from(self.shm.buf, 0)
+            if version % 2:
+                continue
+            slot, height, width, seq = FIELDS.unpack_from(self.shm.buf, FIELDS_OFFSET)
+            if VERSION.unpack_from(self.shm.buf, 0)[0] != version:
+                continue
+            if seq == 0:
+                return None, 0
+            if self.intact(seq):
+                return self.view(slot, width, height), seq
+            # O slot já está sendo reescrito pelo quadro seq + 2; o seq + 1 já foi publicado
+        return None, 0
+
+    def intact(self, seq):
+        # Conferido antes e depois da cópia: o slot ainda guarda o quadro seq, inteiro
+        return self.slot_version(seq % 2) == 2 * seq
+
+    def write_status(self, state, reconnects, fps, last_frame_time):
+        STATUS.pack_into(self.shm.buf, STATUS_OFFSET, STATES.index(state), reconnects, fps, last_frame_time or 0.0)
+
+    def read_status(self):
+        state, reconnects, fps, last_frame_time = STATUS.unpack_from(self.shm.buf, STATUS_OFFSET)
+        return STATES[state], reconnects, fps, last_frame_time or None
+
+    def close(self):
+        self.closed = True
+        self.slots = []
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # Ainda há um quadro em uso; o mapeamento é liberado quando ele for coletado
+
+    def unlink(self):
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+class WorkerStream(VideoStream):
+    # Roda no processo de captura: mesmo laço de reconexão, mas publica direto no buffer compartilhado
+    def __init__(self, url, buffer, control, backend, preview_quality):
+        super().__init__(None, url, preview_quality=preview_quality, backend=backend, out_of_process=False)
+        self.buffer = buffer
+        self.control = control
+        self.ring = None
+
+    def publish(self, frame):
+        max_width, max_height = self.buffer.max_size
+        width, height = self.control[TARGET_WIDTH], self.control[TARGET_HEIGHT]
+        target_size = (min(width, max_width), min(height, max_height)) if width and height else self.buffer.max_size
+        self._target_size = target_size if width and height else None
+        frame = self.scale(frame, target_size)
+        height, width = frame.shape[:2]
+        seq = self.frame_seq + 1
+        slot = self.buffer.begin_write(seq)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self.buffer.view(slot, width, height))
+        self.buffer.commit(seq, width, height)
+        self.frame_seq = seq
+        self.count_frame()
+        self.buffer.write_status(self.state, self.reconnects, self.fps, self.last_frame_time)
+
+    def set_state(self, state):
+        super().set_state(state)
+        self.buffer.write_status(state, self.reconnects, self.fps, self.last_frame_time)
+
+def capture_main(url, buffer_name, control, backend, preview_quality, log_queue):
+    logger = get_logger()
+    logger.setLevel(logging.INFO)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    buffer = FrameBuffer(buffer_name)
+    stream = WorkerStream(url, buffer, control, backend, preview_quality)
+
+    def wait_for_stop():
+        while not control[STOP_REQUESTED]:
+            time.sleep(0.2)
+        stream.running = False
+        stream.stop_event.set()
+
+    threading.Thread(target=wait_for_stop, daemon=True).start()
+    stream.running = True
+    try:
+        stream.update()
+    finally:
+        buffer.close()
+
+class ForwardHandler(logging.Handler):
+    def emit(self, record):
+        get_logger().handle(record)
+
+def get_log_queue():
+    # Registros dos processos de captura voltam para o logger principal
+    global _log_queue, _log_listener
+    if _log_queue is None:
+        _log_queue = _context.Queue()
+        _log_listener = logging.handlers.QueueListener(_log_queue, ForwardHandler())
+        _log_listener.start()
+    return _log_queue
+
+class CaptureWorker:
+    def __init__(self, stream):
+        self.stream = stream
+        self.logger = get_logger()
+        self.buffer = FrameBuffer()
+        self.control = _context.Array("i", 3, lock=False)
+        self.stop_event = threading.Event()
+        self.process = None
+        self.teardown = None
+        self.restarts = 0
+        self.set_target(stream.target_size)
+
+    def set_target(self, size):
+        self.control[TARGET_WIDTH], self.control[TARGET_HEIGHT] = size or (0, 0)
+
+    def spawn(self):
+        self.process = _context.Process(
+            target=capture_main,
+            args=(self.stream.url, self.buffer.name, self.control, self.stream.backend, self.stream.preview_quality, get_log_queue()),
+            name="capture",
+            daemon=True,
+        )
+        self.process.start()
+        return time.monotonic()
+
+    def start(self):
+        threading.Thread(target=self.supervise, daemon=True).start()
+
+    def supervise(self):
+        # Reinicia o processo de captura se ele cair; o atraso cresce enquanto as quedas forem seguidas
+        failures = 0
+        while not self.stop_event.is_set():
+            started = self.spawn()
+            self.process.join()
+            if self.stop_event.is_set():
+                break
+            failures = 1 if time.monotonic() - started > STABLE_RUN else failures + 1
+            self.restarts += 1
+            delay = min(CAPTURE_RESTART_MAX, CAPTURE_RESTART_BASE * 2 ** (failures - 1))
+            self.logger.error(f"Capture process for {self.stream.url} exited with code {self.process.exitcode}, restarting in {delay}s")
+            self.stop_event.wait(delay)
+
+    def latest(self):
+        return self.buffer.latest()
+
+    def intact(self, seq):
+        return self.buffer.intact(seq)
+
+    def status(self):
+        state, reconnects, fps, last_frame_time = self.buffer.read_status()
+        if self.process is None or not self.process.is_alive():
+            state = CLOSED
+        seq = self.buffer.latest()[1]
+        return state, fps, reconnects + self.restarts, last_frame_time, seq
+
+    def stop(self):
+        # Não bloqueia: o despejo do pool acontece no loop do Tk, e o join pode levar segundos
+        self.stop_event.set()
+        self.control[STOP_REQUESTED] = 1
+        if self.teardown is None:
+            self.teardown = threading.Thread(target=self.shutdown, name="capture-stop", daemon=True)
+            self.teardown.start()
+
+    def shutdown(self):
+        if self.process is not None:
+            self.process.join(timeout=2)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join()
+        self.buffer.close()
+        self.buffer.unlink()
+
+    def join(self, timeout=None):
+        if self.teardown is not None:
+            self.teardown.join(timeout)
@@ -9,3 +9,133 @@ IP_FOLDER_MAPPING = {
     "192.9.100.118": "0005",
     "192.9.100.123": "0006"
 }
+
+IMAGE_EXTENSIONS = (".jpg", ".png")
+
+# Varredura de reconciliação (segundos) para shares SMB que perdem notificações
+RECONCILE_INTERVAL = 30
+# Arquivo modificado há menos de INGEST_SETTLE_AGE segundos pode estar em upload: só entra quando duas
+# leituras de tamanho e mtime, a INGEST_SETTLE_DELAY segundos uma da outra, concordam
+INGEST_SETTLE_AGE = 2
+INGEST_SETTLE_DELAY = 0.5
+INGEST_SETTLE_ATTEMPTS = 10
+
+# Primeira exibição na partida: espera um DEF, FIRST_DISPLAY_BATCH eventos ou FIRST_DISPLAY_WAIT segundos
+# e mostra o melhor do lote, em vez do primeiro arquivo que a listagem devolver
+FIRST_DISPLAY_BATCH = 200
+FIRST_DISPLAY_WAIT = 0.5
+
+# Taxa máxima de atualização do vídeo na interface (quadros por segundo)
+DISPLAY_FPS = 20
+
+# Decodifica o stream em resolução reduzida quando a câmera é maior que a tela
+PREVIEW_QUALITY = False
+
+STREAM_URL = "http://admin:@Dm1n@localhost/mjpegstream.cgi?camera={camera}"
+
+# Streams mantidos abertos para troca instantânea de câmera
+STREAM_POOL_SIZE = 3
+STREAM_PREWARM = 2
+STREAM_IDLE_TIMEOUT = 60
+
+# Pré-carregamento dos próximos snapshots da fila
+PREFETCH_COUNT = 5
+PREFETCH_WORKERS = 2
+SNAPSHOT_CACHE_BYTES = 256 * 1024 * 1024
+
+CAMERA_NAMES_URL = "http://localhost/camerasnomes.cgi"
+CAMERA_AUTH = ("admin", "@Dm1n")
+HTTP_TIMEOUT = (3, 10)
+
+# Cache local do mapa de câmeras (nome -> número)
+CAMERA_MAP_CACHE = "cache/camera_map.json"
+CAMERA_MAP_TTL = 3600
+CAMERA_MAP_MIN_REFRESH = 30
+
+LOG_PATH = "logs/app.log"
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+# Mensagens repetidas dentro da janela (segundos) são suprimidas e contadas
+LOG_RATE_WINDOW = 10
+
+# Reconexão dos streams: timeouts e backoff exponencial (segundos)
+STREAM_OPEN_TIMEOUT = 5
+STREAM_READ_TIMEOUT = 5
+STREAM_BACKOFF_BASE = 1
+STREAM_BACKOFF_MAX = 30
+
+# Backend de captura: "opencv" (cv2.VideoCapture) ou "mjpeg" (leitor multipart nativo)
+STREAM_BACKEND = "opencv"
+MJPEG_BUFFER_SIZE = 1024 * 1024
+# Limite do buffer: um stream sem quadro completo até aqui é reconectado em vez de crescer sem fim
+MJPEG_MAX_BUFFER_SIZE = 16 * 1024 * 1024
+
+# Mosaico: câmeras fixas (vazio = câmeras dos eventos pendentes)
+MOSAIC_CAMERAS = []
+MOSAIC_MAX_TILES = 9
+MOSAIC_TILE_FPS = 5
+MOSAIC_WORKERS = 4
+
+# Pré-filtro de falsos positivos (diferença contra o fundo de cada câmera)
+PREFILTER_ENABLED = False
+PREFILTER_ACTION = "deprioritize"  # ou "dismiss"
+PREFILTER_THRESHOLD = 0.01
+PREFILTER_PIXEL_DELTA = 25
+PREFILTER_ALPHA = 0.05
+PREFILTER_SIZE = (160, 120)
+PREFILTER_WORKERS = 2
+
+# Agrupamento de rajadas: mesma câmera, dentro da janela (segundos) e hash perceptual próximo
+BURST_WINDOW = 10
+BURST_MAX_DISTANCE = 10
+# Threads que calculam os hashes (leem a imagem no compartilhamento) fora da thread de ingestão
+BURST_HASH_WORKERS = 2
+FILMSTRIP_MAX = 12
+
+# Decisões do operador executadas em segundo plano, com journal local
+ARCHIVE_PATH = BASE_PATH + r"\arquivo"
+ACTION_JOURNAL = "cache/actions.journal"
+ACTION_RETRY_BASE = 2
+ACTION_RETRY_MAX = 300
+# Lotes a partir deste tamanho listam o diretório uma vez; os menores vão direto, e arquivo sumido conta como feito
+ACTION_LIST_MIN = 20
+
+# Balanceamento entre estações: pasta compartilhada com leases por arquivo
+LOAD_BALANCE = False
+POOL_FOLDER = "pool"
+LEASE_TTL = 60
+LEASE_SWEEP_INTERVAL = 5
+REBALANCE_SLACK = 2
+
+# Journal SQLite de eventos e decisões
+EVENT_JOURNAL = "cache/events.db"
+JOURNAL_BATCH_SIZE = 200
+JOURNAL_FLUSH_INTERVAL = 0.5
+
+# Janelas recorrentes de supressão: (câmera ou "*", "HH:MM" início, "HH:MM" fim, "hold" ou "drop")
+SUPPRESSION_WINDOWS = []
+
+# Métricas: endpoint JSON local (None desativa), resumo periódico no log e profiler por amostragem
+METRICS_PORT = 8765
+METRICS_SUMMARY_INTERVAL = 60
+PROFILER_ENABLED = False
+PROFILER_INTERVAL = 0.01
+PROFILER_THREADS = ("MainThread", "capture")
+
+# Captura e decodificação de cada câmera em um processo separado (memória compartilhada)
+CAPTURE_PROCESSES = False
+CAPTURE_MAX_FRAME = (1920, 1080)
+CAPTURE_RESTART_BASE = 1
+CAPTURE_RESTART_MAX = 30
+
+# Anel de quadros JPEG por stream para voltar no tempo ao redor do evento (0 desliga).
+# O JPEG recebido é só copiado para o anel (backend "mjpeg", ou pacotes crus do OpenCV), também
+# nos streams pré-aquecidos, que assim já têm os segundos antes da exibição. Se o backend do OpenCV
+# não entregar pacotes crus, cada quadro é recodificado só no stream em exibição, e a barra avisa
+# que a gravação começou depois do evento
+RING_SECONDS = 15
+RING_BUFFER_BYTES = 8 * 1024 * 1024
+RING_JPEG_QUALITY = 80
+
+# Modo supervisor (python main.py --supervisor): todas as pastas em um único processo
+SUPERVISOR_FOLDERS = sorted(set(IP_FOLDER_MAPPING.values()))
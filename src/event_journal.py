@@ -0,0 +1,135 @@
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from config import EVENT_JOURNAL, JOURNAL_BATCH_SIZE, JOURNAL_FLUSH_INTERVAL
+from logger import get_logger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    path TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    camera_name TEXT,
+    camera_number TEXT,
+    ip TEXT,
+    captured_at REAL,
+    is_def INTEGER NOT NULL DEFAULT 0,
+    arrived_at REAL NOT NULL,
+    displayed_at REAL,
+    decided_at REAL,
+    decision TEXT,
+    reason TEXT,
+    latency REAL
+);
+CREATE INDEX IF NOT EXISTS idx_events_camera ON events (camera_name, captured_at);
+CREATE INDEX IF NOT EXISTS idx_events_captured ON events (captured_at);
+CREATE INDEX IF NOT EXISTS idx_events_pending ON events (arrived_at) WHERE decided_at IS NULL;
+"""
+
+INSERT_ARRIVAL = "INSERT OR IGNORE INTO events (path, filename, camera_name, camera_number, ip, captured_at, is_def, arrived_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+UPDATE_DISPLAY = "UPDATE events SET displayed_at = ? WHERE path = ? AND displayed_at IS NULL"
+UPDATE_DECISION = "UPDATE events SET decided_at = ?, decision = ?, reason = ?, latency = ? - COALESCE(displayed_at, arrived_at) WHERE path = ?"
+
+class EventJournal:
+    def __init__(self, path=EVENT_JOURNAL, batch_size=JOURNAL_BATCH_SIZE, flush_interval=JOURNAL_FLUSH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.logger = get_logger()
+        self.pending = queue.SimpleQueue()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        connection = self.connect()
+        connection.executescript(SCHEMA)
+        connection.close()
+        self.thread = threading.Thread(target=self.writer, daemon=True)
+        self.thread.start()
+
+    def connect(self):
+        connection = sqlite3.connect(self.path, timeout=10)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def record_arrival(self, event):
+        self.pending.put((INSERT_ARRIVAL, (event.path, event.filename, event.camera_name, event.camera_number, event.ip, event.epoch, int(event.is_def), time.time())))
+
+    def record_display(self, path):
+        self.pending.put((UPDATE_DISPLAY, (time.time(), path)))
+
+    def record_decision(self, paths, decision, reason=None):
+        now = time.time()
+        for path in paths:
+            self.pending.put((UPDATE_DECISION, (now, decision, reason, now, path)))
+
+    def writer(self):
+        # Agrupa as escritas em uma transação por lote; None na fila grava o que falta e encerra
+        connection = self.connect()
+        stopping = False
+        while not stopping:
+            batch = []
+            item = self.pending.get()
+            deadline = time.monotonic() + self.flush_interval
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self.pending.get(timeout=timeout)
+                except queue.Empty:
+                    break
+            stopping = item is None
+            if not batch:
+                continue
+            try:
+                with connection:
+                    # Mantém a ordem entre tipos (chegada antes de exibição e decisão)
+                    start = 0
+                    for index in range(1, len(batch) + 1):
+                        if index == len(batch) or batch[index][0] != batch[start][0]:
+                            connection.executemany(batch[start][0], [params for _, params in batch[start:index]])
+                            start = index
+            except sqlite3.Error as e:
+                self.logger.error(f"Error writing event journal: {e}")
+        connection.close()
+
+    def close(self, timeout=5):
+        self.pending.put(None)
+        self.thread.join(timeout)
+
+    def query(self, sql, params=()):
+        # Leitura em conexão própria; o WAL não bloqueia o escritor
+        connection = self.connect()
+        try:
+            return connection.execute(sql, params).fetchall()
+        finally:
+            connection.close()
+
+    def pending_paths(self):
+        return [row[0] for row in self.query("SELECT path FROM events WHERE decided_at IS NULL ORDER BY arrived_at")]
+
+    def events_per_camera_per_hour(self, since=None):
+        return self.query(
+            "SELECT camera_name, CAST(captured_at / 3600 AS INTEGER) * 3600 AS hour, COUNT(*) FROM events "
+            "WHERE captured_at >= ? GROUP BY camera_name, hour ORDER BY hour, camera_name",
+            (since or 0,))
+
+    def handling_time_percentile(self, percentile=0.95, since=None):
+        count = self.query("SELECT COUNT(*) FROM events WHERE latency IS NOT NULL AND decided_at >= ?", (since or 0,))[0][0]
+        if not count:
+            return None
+        rows = self.query(
+            "SELECT latency FROM events WHERE latency IS NOT NULL AND decided_at >= ? ORDER BY latency LIMIT 1 OFFSET ?",
+            (since or 0, min(count - 1, int(count * percentile))))
+        return rows[0][0]
+
+if __name__ == "__main__":
+    journal = EventJournal(sys.argv[1] if len(sys.argv) > 1 else EVENT_JOURNAL)
+    for camera_name, hour, count in journal.events_per_camera_per_hour():
+        print(f"{time.strftime('%Y-%m-%d %H:00', time.localtime(hour))}  {camera_name}: {count}")
+    p95 = journal.handling_time_percentile()
+    print(f"p95 handling time: {p95:.1f}s" if p95 is not None else "p95 handling time: n/a")
@@ -0,0 +1,195 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from queue import Empty
+
+PRIORITY_DEF = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+def default_priority(event):
+    return PRIORITY_DEF if event.is_def else PRIORITY_NORMAL
+
+class EventQueue:
+    def __init__(self):
+        self.heap = []
+        self.entries = {}
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+
+    def __len__(self):
+        with self.condition:
+            return len(self.entries)
+
+    def __contains__(self, path):
+        with self.condition:
+            return path in self.entries
+
+    def qsize(self):
+        return len(self)
+
+    def empty(self):
+        return len(self) == 0
+
+    def put(self, event, priority=None):
+        if priority is None:
+            priority = default_priority(event)
+        with self.condition:
+            old = self.entries.get(event.path)
+            if old:
+                old[-1] = None
+                self._compact()
+            # Sem data no nome, ordena pela chegada
+            timestamp = event.epoch or time.time()
+            entry = [priority, timestamp, next(self.counter), event]
+            self.entries[event.path] = entry
+            heapq.heappush(self.heap, entry)
+            self.condition.notify()
+
+    def reprioritize(self, path, priority):
+        with self.condition:
+            entry = self.entries.get(path)
+            if entry is None:
+                return False
+            self.put(entry[-1], priority)
+            return True
+
+    def remove(self, path):
+        with self.condition:
+            entry = self.entries.pop(path, None)
+            if entry is None:
+                return False
+            entry[-1] = None
+            self._compact()
+            return True
+
+    def get(self, block=False, timeout=None):
+        with self.condition:
+            if block and not self.condition.wait_for(lambda: self.entries, timeout):
+                raise Empty
+            while self.heap:
+                entry = heapq.heappop(self.heap)
+                event = entry[-1]
+                if event is not None:
+                    del self.entries[event.path]
+                    return event
+            raise Empty
+
+    def peek(self, n=1):
+        return [entry[-1] for entry in self.ranked(n)]
+
+    def tail(self, n=1):
+        # Os n eventos de menor prioridade
+        return [entry[-1] for entry in self.ranked(n, largest=True)]
+
+    def ranked(self, n, largest=False):
+        # Entradas [prioridade, horário, contador, evento] na ordem de saída
+        with self.condition:
+            live = (entry for entry in self.heap if entry[-1] is not None)
+            return (heapq.nlargest if largest else heapq.nsmallest)(n, live)
+
+    def head(self):
+        with self.condition:
+            while self.heap and self.heap[0][-1] is None:
+                heapq.heappop(self.heap)
+            return self.heap[0] if self.heap else None
+
+    def _compact(self):
+        # Remoções são preguiçosas; reconstrói o heap quando metade for lixo
+        if len(self.heap) > 2 * len(self.entries) + 64:
+            self.heap = [entry for entry in self.heap if entry[-1] is not None]
+            heapq.heapify(self.heap)
+
+class FolderScheduler:
+    # Uma fila por pasta com a mesma interface do EventQueue. A próxima é a de melhor
+    # prioridade; entre pastas empatadas, a menos atendida até agora
+    def __init__(self, folders):
+        self.queues = {os.path.normpath(folder): EventQueue() for folder in folders}
+        self.served = dict.fromkeys(self.queues, 0)
+        self.condition = threading.Condition()
+
+    def __len__(self):
+        return sum(len(queue) for queue in self.queues.values())
+
+    def __contains__(self, path):
+        queue = self.queues.get(self.folder_of(path))
+        return queue is not None and path in queue
+
+    def qsize(self):
+        return len(self)
+
+    def empty(self):
+        return len(self) == 0
+
+    def folder_of(self, path):
+        return os.path.dirname(os.path.normpath(path))
+
+    def backlog(self):
+        return {folder: len(queue) for folder, queue in self.queues.items()}
+
+    def put(self, event, priority=None):
+        folder = self.folder_of(event.path)
+        with self.condition:
+            queue = self.queues.get(folder)
+            if queue is None:
+                queue = self.queues[folder] = EventQueue()
+                self.served[folder] = 0
+            if queue.empty():
+                # Uma pasta que estava parada entra no ritmo das outras, sem crédito acumulado
+                active = [self.served[name] for name, other in self.queues.items() if name != folder and not other.empty()]
+                if active:
+                    self.served[folder] = max(self.served[folder], min(active))
+            queue.put(event, priority)
+            self.condition.notify()
+
+    def reprioritize(self, path, priority):
+        queue = self.queues.get(self.folder_of(path))
+        return queue is not None and queue.reprioritize(path, priority)
+
+    def remove(self, path):
+        queue = self.queues.get(self.folder_of(path))
+        return queue is not None and queue.remove(path)
+
+    def choose(self, heads, served):
+        best = None
+        for folder, head in heads.items():
+            if head is None:
+                continue
+            rank = (head[0], served[folder], head[1])
+            if best is None or rank < best[0]:
+                best = (rank, folder)
+        return best[1] if best else None
+
+    def get(self, block=False, timeout=None):
+        with self.condition:
+            if block and not self.condition.wait_for(lambda: not self.empty(), timeout):
+                raise Empty
+            folder = self.choose({name: queue.head() for name, queue in self.queues.items()}, self.served)
+            if folder is None:
+                raise Empty
+            event = self.queues[folder].get()
+            self.served[folder] += 1
+            return event
+
+    def peek(self, n=1):
+        # Simula as próximas n escolhas do get()
+        with self.condition:
+            ranked = {folder: queue.ranked(n) for folder, queue in self.queues.items()}
+            served = dict(self.served)
+        positions = dict.fromkeys(ranked, 0)
+        events = []
+        while len(events) < n:
+            heads = {folder: entries[positions[folder]] if positions[folder] < len(entries) else None for folder, entries in ranked.items()}
+            folder = self.choose(heads, served)
+            if folder is None:
+                break
+            events.append(heads[folder][-1])
+            positions[folder] += 1
+            served[folder] += 1
+        return events
+
+    def tail(self, n=1):
+        entries = [entry for queue in self.queues.values() for entry in queue.ranked(n, largest=True)]
+        return [entry[-1] for entry in heapq.nlargest(n, entries)]
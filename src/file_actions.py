@@ -0,0 +1,183 @@
+import heapq
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from archive_pack import ArchivePacker
+from config import ARCHIVE_PATH, ACTION_JOURNAL, ACTION_LIST_MIN, ACTION_RETRY_BASE, ACTION_RETRY_MAX
+from logger import get_logger
+
+DELETE = "delete"
+ARCHIVE = "archive"
+TAG = "tag"
+
+class FileAction:
+    __slots__ = ("id", "kind", "paths", "reason", "attempts")
+
+    def __init__(self, kind, paths, reason=None, action_id=None):
+        self.id = action_id or uuid.uuid4().hex
+        self.kind = kind
+        self.paths = list(paths)
+        self.reason = reason
+        self.attempts = 0
+
+    def to_json(self):
+        return json.dumps({"id": self.id, "kind": self.kind, "paths": self.paths, "reason": self.reason}, ensure_ascii=False)
+
+class FileActionWorker:
+    def __init__(self, archive_path=ARCHIVE_PATH, journal_path=ACTION_JOURNAL, on_done=None):
+        self.archive_path = archive_path
+        self.journal_path = journal_path
+        self.on_done = on_done
+        self.logger = get_logger()
+        self.ready = []
+        self.delayed = []
+        self.condition = threading.Condition()
+        self.journal_lock = threading.Lock()
+        self.journal = None
+        # Todo snapshot tratado vai para o pack diário com a sua decisão, inclusive os descartados
+        self.packer = ArchivePacker(archive_path)
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        pending = self.replay()
+        self.running = True
+        with self.condition:
+            self.ready.extend(pending)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        if pending:
+            self.logger.info(f"Resuming {len(pending)} pending file actions from journal")
+
+    def stop(self, timeout=10):
+        # Executa o que já está pronto antes de sair; os adiados ficam no journal para a próxima vez
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def replay(self):
+        # Reescreve o journal só com as ações que não chegaram a terminar
+        os.makedirs(os.path.dirname(self.journal_path) or ".", exist_ok=True)
+        actions = {}
+        try:
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # Linha incompleta de uma queda no meio da escrita
+                    if "done" in record:
+                        actions.pop(record["done"], None)
+                    else:
+                        actions[record["id"]] = FileAction(record["kind"], record["paths"], record.get("reason"), record["id"])
+        except FileNotFoundError:
+            pass
+        tmp_path = f"{self.journal_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for action in actions.values():
+                f.write(action.to_json() + "\n")
+        os.replace(tmp_path, self.journal_path)
+        self.journal = open(self.journal_path, "a", encoding="utf-8")
+        return list(actions.values())
+
+    def write_journal(self, line, sync=False):
+        with self.journal_lock:
+            self.journal.write(line + "\n")
+            self.journal.flush()
+            if sync:
+                os.fsync(self.journal.fileno())
+
+    def submit(self, kind, paths, reason=None):
+        action = FileAction(kind, paths, reason)
+        self.write_journal(action.to_json(), sync=True)
+        with self.condition:
+            self.ready.append(action)
+            self.condition.notify()
+        return action.id
+
+    def run(self):
+        while True:
+            with self.condition:
+                while True:
+                    now = time.monotonic()
+                    while self.delayed and self.delayed[0][0] <= now:
+                        self.ready.append(heapq.heappop(self.delayed)[-1])
+                    if self.ready or not self.running:
+                        break
+                    timeout = self.delayed[0][0] - now if self.delayed else None
+                    self.condition.wait(timeout)
+                # Tudo que estiver pronto vai no mesmo lote
+                batch, self.ready = self.ready, []
+                running = self.running
+            if batch:
+                self.execute(batch)
+            if not running:
+                self.packer.close()
+                with self.journal_lock:
+                    self.journal.close()
+                return
+
+    def execute(self, batch):
+        by_directory = defaultdict(list)
+        for action in batch:
+            for path in action.paths:
+                by_directory[os.path.dirname(path)].append((action, path))
+        failed = defaultdict(list)
+        tagged = []
+        to_pack = []
+        for directory, items in by_directory.items():
+            if len(items) < ACTION_LIST_MIN:
+                to_pack.extend(items)
+                continue
+            # Lote grande (backlog, retomada): uma listagem por diretório em vez de uma abertura por arquivo
+            try:
+                present = {entry.name for entry in os.scandir(directory)}
+            except OSError as e:
+                self.logger.error(f"Error listing {directory}: {e}")
+                for action, path in items:
+                    failed[action.id].append(path)
+                continue
+            for action, path in items:
+                if os.path.basename(path) in present:
+                    to_pack.append((action, path))
+        if to_pack:
+            failed_packing, missing = map(set, self.packer.pack([(path, action.kind, action.reason) for action, path in to_pack]))
+            for action, path in to_pack:
+                if path in failed_packing:
+                    self.logger.error(f"Error packing {path} for {action.kind}")
+                    failed[action.id].append(path)
+                elif action.kind == TAG and path not in missing:
+                    tagged.append((action, path))
+        if tagged:
+            self.write_reasons(tagged)
+        for action in batch:
+            if action.id in failed:
+                self.retry(action, failed[action.id])
+            else:
+                self.write_journal(json.dumps({"done": action.id}))
+                self.logger.info(f"File action {action.kind} done for {len(action.paths)} files")
+                if self.on_done:
+                    self.on_done(action)
+
+    def write_reasons(self, tagged):
+        os.makedirs(self.archive_path, exist_ok=True)
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        lines = "".join(f"{stamp};{os.path.basename(path)};{action.reason}\n" for action, path in tagged)
+        try:
+            with open(os.path.join(self.archive_path, "motivos.csv"), "a", encoding="utf-8") as f:
+                f.write(lines)
+        except OSError as e:
+            self.logger.error(f"Error writing reasons: {e}")
+
+    def retry(self, action, paths):
+        action.paths = paths
+        action.attempts += 1
+        delay = min(ACTION_RETRY_MAX, ACTION_RETRY_BASE * 2 ** (action.attempts - 1))
+        self.logger.warning(f"Retrying {action.kind} for {len(paths)} files in {delay}s (attempt {action.attempts})")
+        with self.condition:
+            heapq.heappush(self.delayed, (time.monotonic() + delay, action.attempts, action.id, action))
@@ -0,0 +1,81 @@
+import os
+import threading
+import time
+from collections import namedtuple
+from config import IMAGE_EXTENSIONS, INGEST_SETTLE_AGE
+
+FileEntry = namedtuple("FileEntry", ["name", "size", "mtime", "seen"])
+
+class FileIndex:
+    def __init__(self, extensions=IMAGE_EXTENSIONS, settle_age=INGEST_SETTLE_AGE):
+        self.extensions = extensions
+        self.settle_age = settle_age
+        self.entries = {}
+        # Última leitura (tamanho, mtime) de arquivos recentes que talvez ainda estejam sendo gravados
+        self.unsettled = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
+
+    def __contains__(self, name):
+        with self.lock:
+            return name in self.entries
+
+    def accepts(self, name):
+        return name.lower().endswith(self.extensions)
+
+    def settled(self, name, size, mtime):
+        # Chamado com o lock: arquivo antigo, ou igual à leitura anterior; senão guarda esta leitura
+        if time.time() - mtime >= self.settle_age or self.unsettled.get(name) == (size, mtime):
+            self.unsettled.pop(name, None)
+            return True
+        self.unsettled[name] = (size, mtime)
+        return False
+
+    def unsettled_names(self):
+        with self.lock:
+            return list(self.unsettled)
+
+    def add(self, name, size, mtime, settled=True):
+        # Retorna True apenas na primeira vez que o arquivo é visto completo
+        with self.lock:
+            if name in self.entries or not (settled or self.settled(name, size, mtime)):
+                return False
+            self.entries[name] = FileEntry(name, size, mtime, time.monotonic())
+            return True
+
+    def scan(self, path, on_new=None):
+        # Entrega cada arquivo novo assim que aparece na listagem
+        started = time.monotonic()
+        found = set()
+        new_entries = []
+        with os.scandir(path) as it:
+            for item in it:
+                if not self.accepts(item.name) or not item.is_file():
+                    continue
+                # Em shares SMB o stat do scandir vem da própria listagem
+                st = item.stat()
+                found.add(item.name)
+                with self.lock:
+                    known = self.entries.get(item.name)
+                    if known is None:
+                        if not self.settled(item.name, st.st_size, st.st_mtime):
+                            continue  # Ainda em upload; fica para a próxima leitura
+                        entry = FileEntry(item.name, st.st_size, st.st_mtime, time.monotonic())
+                        self.entries[item.name] = entry
+                    elif known.size != st.st_size or known.mtime != st.st_mtime:
+                        self.entries[item.name] = known._replace(size=st.st_size, mtime=st.st_mtime)
+                if known is None:
+                    new_entries.append(entry)
+                    if on_new:
+                        on_new(entry)
+        with self.lock:
+            # Só remove o que já era conhecido antes da listagem começar
+            stale = [name for name, entry in self.entries.items() if name not in found and entry.seen < started]
+            for name in stale:
+                del self.entries[name]
+            for name in [name for name in self.unsettled if name not in found]:
+                del self.unsettled[name]
+        return new_entries
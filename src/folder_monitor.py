@@ -1,26 +1,114 @@
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
+import os
+import threading
 import time
+from config import INGEST_SETTLE_ATTEMPTS, INGEST_SETTLE_DELAY, RECONCILE_INTERVAL
+from file_index import FileIndex
 from logger import get_logger
+from metrics import get_metrics
 
 class FolderMonitor(FileSystemEventHandler):
-    def __init__(self, path, callback):
+    def __init__(self, path, callback, reconcile_interval=RECONCILE_INTERVAL, on_ready=None, observer=None, resume=None):
         self.path = path
         self.callback = callback
+        self.on_ready = on_ready
+        self.resume = resume
+        self.reconcile_interval = reconcile_interval
         self.logger = get_logger()
-        self.observer = Observer()
+        self.metrics = get_metrics()
+        self.index = FileIndex()
+        # No modo supervisor várias pastas compartilham um único observer
+        self.owns_observer = observer is None
+        self.observer = observer or Observer()
+        self.watch = None
+        self.stop_event = threading.Event()
 
     def on_created(self, event):
-        if not event.is_directory and event.src_path.endswith(('.jpg', '.png')):
-            self.logger.info(f"New image detected: {event.src_path}")
-            self.callback(event.src_path)
+        if not event.is_directory:
+            self.ingest(event.src_path)
+
+    def on_moved(self, event):
+        # Uploads FTP costumam gravar um temporário e renomear ao final
+        # O rename marca o fim do upload: o arquivo já está completo
+        if not event.is_directory and os.path.dirname(os.path.abspath(event.dest_path)) == os.path.abspath(self.path):
+            self.ingest(event.dest_path, settled=True)
+
+    def ingest(self, path, settled=False, attempts=INGEST_SETTLE_ATTEMPTS):
+        name = os.path.basename(path)
+        if not self.index.accepts(name) or self.stop_event.is_set():
+            return
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        if self.index.add(name, st.st_size, st.st_mtime, settled):
+            self.metrics.mark(path, "detected")
+            self.logger.info(f"New image detected: {path}")
+            self.callback(path)
+        elif attempts and name not in self.index:
+            self.recheck(path, attempts - 1)
+
+    def recheck(self, path, attempts=INGEST_SETTLE_ATTEMPTS):
+        # Upload em andamento: lê de novo em instantes, sem prender a thread do observer;
+        # esgotadas as tentativas, a reconciliação pega o arquivo
+        timer = threading.Timer(INGEST_SETTLE_DELAY, self.ingest, (path, False, attempts))
+        timer.daemon = True
+        timer.start()
+
+    def seed(self, paths):
+        # Arquivos já enfileirados (retomados do journal) não são emitidos de novo
+        for path in paths:
+            self.index.add(os.path.basename(path), 0, 0)
+
+    def reconcile(self):
+        try:
+            with self.metrics.timer("folder_scan"):
+                self.index.scan(self.path, self.emit)
+        except OSError as e:
+            self.logger.error(f"Error scanning folder {self.path}: {e}")
+        # Arquivos ainda em upload na listagem não esperam a próxima varredura
+        for name in self.index.unsettled_names():
+            self.recheck(os.path.join(self.path, name))
+
+    def emit(self, entry):
+        path = os.path.join(self.path, entry.name)
+        self.metrics.mark(path, "detected")
+        self.logger.info(f"New image detected: {path}")
+        self.callback(path)
+
+    def reconcile_loop(self):
+        # Backlog inicial indexado em segundo plano; a janela não espera a listagem
+        started = time.perf_counter()
+        if self.resume:
+            # Pendentes do journal entram antes da primeira varredura e fora da thread do Tk:
+            # cada um pode gravar um lease e ler a imagem no compartilhamento
+            self.seed(self.resume(self.path))
+        self.reconcile()
+        self.logger.info(f"Initial scan indexed {len(self.index)} files in {time.perf_counter() - started:.3f}s")
+        if self.on_ready:
+            self.on_ready()
+        while not self.stop_event.wait(self.reconcile_interval):
+            started = time.perf_counter()
+            self.reconcile()
+            self.logger.debug(f"Reconciled {len(self.index)} files in {time.perf_counter() - started:.3f}s")
 
     def start(self):
-        self.observer.schedule(self, self.path, recursive=False)
-        self.observer.start()
+        if os.path.exists(self.path):
+            self.watch = self.observer.schedule(self, self.path, recursive=False)
+            if not self.observer.is_alive():
+                self.observer.start()
+        else:
+            self.logger.error(f"Folder not found, relying on reconciliation scans: {self.path}")
+        threading.Thread(target=self.reconcile_loop, daemon=True).start()
         self.logger.info(f"Started monitoring folder: {self.path}")
 
     def stop(self):
-        self.observer.stop()
-        self.observer.join()
+        self.stop_event.set()
+        if not self.owns_observer:
+            if self.watch is not None:
+                self.observer.unschedule(self.watch)
+        elif self.observer.is_alive():
+            self.observer.stop()
+            self.observer.join()
         self.logger.info("Stopped monitoring folder")
@@ -0,0 +1,60 @@
+import bisect
+import threading
+import time
+from collections import deque
+from config import RING_BUFFER_BYTES, RING_SECONDS
+
+class FrameRing:
+    # Últimos segundos de um stream como JPEG, em um único bytearray pré-alocado e limitado por bytes
+    def __init__(self, max_bytes=RING_BUFFER_BYTES, seconds=RING_SECONDS):
+        self.data = bytearray(max_bytes)
+        self.seconds = seconds
+        # (horário, offset, tamanho) em ordem de chegada
+        self.entries = deque()
+        self.head = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def append(self, jpeg, timestamp=None):
+        # Aceita bytes, memoryview ou o array devolvido pelo cv2
+        jpeg = memoryview(jpeg).cast("B")
+        length = len(jpeg)
+        if length == 0 or length > len(self.data):
+            return False
+        timestamp = time.time() if timestamp is None else timestamp
+        with self.lock:
+            entries = self.entries
+            if self.head + length > len(self.data):
+                # O fim do buffer é abandonado; o que estava lá é o mais antigo
+                while entries and entries[0][1] >= self.head:
+                    entries.popleft()
+                self.head = 0
+            end = self.head + length
+            while entries and entries[0][1] < end and entries[0][1] + entries[0][2] > self.head:
+                entries.popleft()
+            while entries and entries[0][0] < timestamp - self.seconds:
+                entries.popleft()
+            self.data[self.head:end] = jpeg
+            entries.append((timestamp, self.head, length))
+            self.head = end
+        return True
+
+    def span(self):
+        with self.lock:
+            if not self.entries:
+                return None
+            return self.entries[0][0], self.entries[-1][0]
+
+    def nearest(self, timestamp):
+        # Retorna (horário, bytes) do quadro mais próximo do horário pedido
+        with self.lock:
+            if not self.entries:
+                return None
+            entries = self.entries
+            index = bisect.bisect_left(entries, timestamp, key=lambda entry: entry[0])
+            if index == len(entries) or (index > 0 and timestamp - entries[index - 1][0] < entries[index][0] - timestamp):
+                index -= 1
+            captured, offset, length = self.entries[index]
+            return captured, bytes(self.data[offset:offset + length])
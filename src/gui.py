@@ -1,30 +1,46 @@
-from config import BASE_PATH, IP_FOLDER_MAPPING
+import queue
 import tkinter as tk
-from PIL import Image, ImageTk
-from video_stream import VideoStream
-from logger import get_logger
+from tkinter import simpledialog
+from stream_pool import StreamPool
+from logger import get_logger, tail_lines
 import os
-import re
-import requests
-from requests.auth import HTTPBasicAuth
-from queue import Queue
-import socket
-import threading
-import time
+from config import LOG_PATH, MOSAIC_CAMERAS, MOSAIC_MAX_TILES, STREAM_PREWARM, FILMSTRIP_MAX, RING_SECONDS
+from file_actions import ARCHIVE, DELETE, TAG
+from pipeline import EventPipeline
+from metrics import get_metrics
 
-class MainGUI:
-    processing_lock = False  # Inicia desbloqueado
+LOG_WINDOW_LINES = 100
+LOG_WINDOW_REFRESH_MS = 500
+CALL_POLL_MS = 20
 
-    def __init__(self, root):
+class MainGUI:
+    def __init__(self, root, startup=None, pool_path=None, folders=None):
         self.root = root
+        self.startup = startup
         self.root.title("Motion Detection")
         self.logger = get_logger()
+        self.metrics = get_metrics()
         self.is_fullscreen = False
         self.stream = None
-        self.camera_map = {}
-        self.image_queue = Queue()
-        self.current_image = None
+        self.stream_pool = StreamPool()
+        self.mosaic = None
+        self.filmstrip_images = []
         self.current_camera_number = None
+        self.pipeline = EventPipeline((self.root.winfo_screenwidth(), self.root.winfo_screenheight()), pool_path=pool_path, folders=folders)
+        # Chamadas vindas de outras threads: root.after fora da thread principal falha antes do mainloop
+        self.calls = queue.SimpleQueue()
+        self.pipeline.on_queued = lambda: self.call_soon(self.show_next_image, True)
+        self.pipeline.on_burst_grown = lambda burst: self.call_soon(self.update_filmstrip)
+        self.pipeline.on_current_lost = lambda event: self.call_soon(self.skip_lost, event)
+        self.folders = folders
+        self.image_queue = self.pipeline.image_queue
+        self.bursts = self.pipeline.bursts
+        self.snapshot_cache = self.pipeline.snapshot_cache
+        self.camera_map = self.pipeline.camera_map
+        self.parser = self.pipeline.parser
+        self.camera_map.listeners.append(self.on_camera_map_updated)
+        self.metrics.add_collector(self.collect_metrics)
+        self.pipeline.start()
         
         self.root.attributes('-topmost', True)
         self.metadata_label = tk.Label(self.root, text="", font=("Arial", 12), bg="black", fg="white")
@@ -39,141 +55,305 @@ class MainGUI:
         self.thumbnail_label.place(relx=0.9, rely=0.098, anchor="nw")
         self.thumbnail_label.bind("<Button-1>", self.toggle_thumbnail)
         self.thumbnail_label.lift()
+        self.filmstrip_frame = tk.Frame(self.root, bg="black")
         self.button_frame = tk.Frame(self.root)
         self.button_frame.place(relx=0.5, rely=1.0, anchor="s")
         self.button_frame.lift()
-        buttons = ["Sem motivo aparente", "Evento devido à...", "Inibir detecções por...", "Escolher motivo", "Pausar por 1 minuto"]
+        # Barra para voltar no tempo ao redor do horário do evento (anel de quadros do stream)
+        self.scrub_frame = tk.Frame(self.root, bg="black")
+        self.scrub_scale = tk.Scale(self.scrub_frame, from_=-RING_SECONDS, to=RING_SECONDS, resolution=0.2, orient=tk.HORIZONTAL, length=400, showvalue=False, bg="black", fg="white", highlightthickness=0)
+        self.scrub_scale.bind("<B1-Motion>", self.scrub)
+        self.scrub_scale.bind("<ButtonRelease-1>", self.scrub)
+        self.scrub_scale.pack(side=tk.LEFT, padx=5)
+        self.scrub_label = tk.Label(self.scrub_frame, text="Ao vivo", width=18, bg="black", fg="white")
+        self.scrub_label.pack(side=tk.LEFT)
+        tk.Button(self.scrub_frame, text="Ao vivo", command=self.resume_live).pack(side=tk.LEFT, padx=5)
+        if RING_SECONDS:
+            self.scrub_frame.place(relx=0.5, rely=1.0, y=-45, anchor="s")
+            self.scrub_frame.lift()
+        buttons = ["Sem motivo aparente", "Evento devido à...", "Arquivar evento", "Inibir detecções por...", "Escolher motivo", "Pausar por 1 minuto"]
         for text in buttons:
             if text == "Sem motivo aparente":
                 tk.Button(self.button_frame, text=text, command=self.handle_no_reason).pack(side=tk.LEFT, padx=5, pady=5)
+            elif text == "Arquivar evento":
+                tk.Button(self.button_frame, text=text, command=self.handle_archive).pack(side=tk.LEFT, padx=5, pady=5)
+            elif text == "Inibir detecções por...":
+                tk.Button(self.button_frame, text=text, command=self.inhibit_current_camera).pack(side=tk.LEFT, padx=5, pady=5)
+            elif text == "Pausar por 1 minuto":
+                tk.Button(self.button_frame, text=text, command=self.pause_detections).pack(side=tk.LEFT, padx=5, pady=5)
+            elif text in ("Evento devido à...", "Escolher motivo"):
+                tk.Button(self.button_frame, text=text, command=lambda t=text: self.handle_reason(t)).pack(side=tk.LEFT, padx=5, pady=5)
             else:
                 tk.Button(self.button_frame, text=text, command=lambda t=text: self.button_action(t)).pack(side=tk.LEFT, padx=5, pady=5)
         self.log_window = None
         self.root.bind("<Control-F12>", self.toggle_log_window)
+        self.root.bind("<Control-F11>", self.toggle_mosaic)
         self.root.withdraw()
+        self.root.after(CALL_POLL_MS, self.run_calls)
         self.start_monitoring()
 
+    def call_soon(self, func, *args):
+        self.calls.put((func, args))
+
+    def run_calls(self):
+        # Executa na thread do Tk o que as outras threads pediram
+        while True:
+            try:
+                func, args = self.calls.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                func(*args)
+            except Exception as e:
+                self.logger.error(f"Error in {func.__name__}: {e}")
+        self.root.after(CALL_POLL_MS, self.run_calls)
+
     def button_action(self, text):
         self.logger.info(f"Button clicked: {text}")
 
     def handle_no_reason(self):
-        if self.current_image and os.path.exists(self.current_image):
-            os.remove(self.current_image)
-            self.logger.info(f"Deleted image: {self.current_image}")
-            MainGUI.processing_lock = False
-            if not self.image_queue.empty():
-                self.current_image = self.image_queue.get()
-                filename = os.path.basename(self.current_image)
-                match = re.match(r"(\d{8}-\d{6})_([\d.]+)_(.+)_(\d{4})\.jpg", filename)
-                if match:
-                    camera_name = match.group(3)
-                    self.current_camera_number = self.camera_map.get(camera_name, "0")
-                    if self.stream:
-                        self.stream.stop()
-                    self.stream = VideoStream(self.video_label, f"http://admin:@Dm1n@localhost/mjpegstream.cgi?camera={self.current_camera_number}")
-                    self.stream.start()
-                    self.load_thumbnail(self.current_image)
-                self.logger.info(f"Updated video and thumbnail for: {self.current_image}")
-            else:
-                self.current_image = None
-                self.logger.info("No more images")
-            MainGUI.processing_lock = True
+        self.resolve_current(DELETE)
 
-    def fetch_camera_names(self):
-        try:
-            response = requests.get("http://localhost/camerasnomes.cgi", auth=HTTPBasicAuth("admin", "@Dm1n"))
-            response.raise_for_status()
-            pairs = response.text.split("&")
-            for pair in pairs:
-                if "=" in pair:
-                    number, name = pair.split("=")
-                    camera_name = name.split(".")[0] if "." in name else name
-                    self.camera_map[camera_name] = number
-                    self.logger.info(f"Parsed camera: {camera_name} = {number}")
-        except Exception as e:
-            self.logger.error(f"Error fetching API data: {e}")
+    def handle_archive(self):
+        # Guarda o evento no pack como evidência, sem motivo
+        self.resolve_current(ARCHIVE)
+
+    def handle_reason(self, title):
+        if not self.current_event:
+            return
+        reason = simpledialog.askstring(title, "Motivo:", parent=self.root)
+        if reason:
+            self.resolve_current(TAG, reason.strip())
+
+    def inhibit_current_camera(self):
+        # Sem câmera no nome a regra valeria para todos os snapshots não reconhecidos
+        if not self.current_event or not self.current_event.parsed:
+            return
+        camera = self.current_event.camera_name
+        minutes = simpledialog.askinteger("Inibir detecções", f"Minutos para {camera}:", parent=self.root, minvalue=1)
+        if not minutes:
+            return
+        self.pipeline.inhibit(camera, minutes * 60)
+
+    def pause_detections(self):
+        self.pipeline.pause(60)
+
+    @property
+    def current_event(self):
+        return self.pipeline.current
+
+    def resolve_current(self, action, reason=None):
+        if self.pipeline.resolve(action, reason):
+            self.show_next_image()
+
+    def skip_lost(self, event):
+        if self.pipeline.skip(event):
+            self.show_next_image()
+
+    # Entradas usadas pelo main.py (FolderMonitor e journal)
+    def enqueue_image(self, image_path):
+        self.pipeline.enqueue_image(image_path)
+
+    def resume_from_journal(self, folder):
+        return self.pipeline.resume_from_journal(folder)
+
+    def on_backlog_indexed(self, index, folder=None):
+        self.pipeline.on_backlog_indexed(index, folder)
+
+    def show_next_image(self, expand=False):
+        if self.current_event is not None:
+            return
+        if self.pipeline.next_event() is None:
+            self.logger.info("No more images")
+            return
+        if self.folders:
+            self.update_backlog_title()
+        self.current_camera_number = None
+        self.show_current_stream()
+        upcoming = self.image_queue.peek(STREAM_PREWARM)
+        self.stream_pool.prewarm([event.camera_number for event in upcoming if event.camera_number])
+        self.show_interface(self.current_event)
+        self.pipeline.displayed(self.current_event)
+        if expand:
+            self.toggle_thumbnail(None)  # Expande o thumbnail automaticamente
+        self.logger.info(f"Updated video and thumbnail for: {self.current_event.path}")
+        if self.startup:
+            self.startup.milestone("first event displayed")
+
+    def show_current_stream(self):
+        event = self.current_event
+        if event is None:
+            return
+        if not event.parsed:
+            self.show_stream_placeholder("Câmera desconhecida")
+            return
+        # Eventos enfileirados antes da atualização do mapa ainda não têm número
+        camera_number = event.camera_number or self.camera_map.lookup(event.camera_name)
+        if camera_number is None:
+            # O stream é ligado pelo on_camera_map_resolved quando o mapa chegar
+            self.logger.warning(f"No camera number for {event.camera_name}, waiting for camera map refresh")
+            self.show_stream_placeholder("Aguardando mapa de câmeras")
+            return
+        self.current_camera_number = camera_number
+        if self.mosaic is None:
+            self.video_label.configure(text="")
+            self.stream = self.stream_pool.acquire(camera_number, self.video_label)
+            self.resume_live()
+
+    def show_stream_placeholder(self, text):
+        # Nunca deixa o vídeo de outra câmera ao lado do evento atual
+        if self.mosaic is not None:
+            return
+        self.stream_pool.release_active()
+        self.stream = None
+        self.video_label.configure(image="", text=text, fg="white", bg="black", font=("Arial", 24))
+        self.video_label.image = None
+
+    def scrub(self, event=None):
+        current = self.current_event
+        if current is None or not current.parsed or self.stream is None:
+            return
+        offset = self.scrub_scale.get()
+        captured = self.stream.show_recorded(current.epoch + offset)
+        span = self.stream.recorded_span()
+        if captured is None:
+            self.scrub_label.configure(text="Sem quadros gravados")
+        elif span and current.epoch + offset < span[0] - 1:
+            # Antes do início da gravação (stream aberto depois do evento): mostra o mais antigo e avisa
+            self.scrub_label.configure(text=f"Gravado só após {span[0] - current.epoch:+.1f}s")
+        else:
+            self.scrub_label.configure(text=f"Evento {captured - current.epoch:+.1f}s")
+
+    def resume_live(self):
+        self.scrub_scale.set(0)
+        self.scrub_label.configure(text="Ao vivo")
+        if self.stream is not None:
+            self.stream.resume_live()
+
+    def pending_cameras(self):
+        events = ([self.current_event] if self.current_event else []) + self.image_queue.peek(MOSAIC_MAX_TILES * 4)
+        cameras = []
+        for event in events:
+            camera_number = event.camera_number or (self.camera_map.get(event.camera_name) if event.parsed else None)
+            if camera_number and camera_number not in cameras:
+                cameras.append(camera_number)
+        return cameras[:MOSAIC_MAX_TILES]
+
+    def toggle_mosaic(self, event=None):
+        if self.mosaic is not None:
+            self.close_mosaic()
+            return
+        cameras = MOSAIC_CAMERAS or self.pending_cameras()
+        if not cameras:
+            self.logger.info("Mosaic not opened: no cameras pending")
+            return
+        from mosaic import MosaicView
+        if self.stream:
+            self.stream.detach()
+        self.mosaic = MosaicView(self.video_label, self.stream_pool, self.promote_camera)
+        self.mosaic.show(cameras)
+
+    def close_mosaic(self, camera_number=None):
+        # Assume o stream antes de liberar os fixados, para não ser despejado do pool
+        mosaic, self.mosaic = self.mosaic, None
+        if camera_number is None:
+            self.show_current_stream()
+        else:
+            self.current_camera_number = camera_number
+            self.stream = self.stream_pool.acquire(camera_number, self.video_label)
+        mosaic.close()
+
+    def promote_camera(self, camera_number):
+        # O stream já está aberto no pool: troca sem reconectar
+        self.close_mosaic(camera_number)
+
+    def on_camera_map_updated(self):
+        # Chamado pela thread de atualização do CameraMap
+        self.parser.clear()
+        self.call_soon(self.on_camera_map_resolved)
+
+    def on_camera_map_resolved(self):
+        if self.current_event is not None and self.current_camera_number is None:
+            self.show_current_stream()
+
+    def update_backlog_title(self):
+        backlog = " | ".join(f"{os.path.basename(folder)}: {count}" for folder, count in sorted(self.image_queue.backlog().items()))
+        self.root.title(f"Motion Detection - {backlog}")
+
+    def collect_metrics(self):
+        # Chamado pelo endpoint e pelo resumo periódico, fora do loop do Tk
+        streams = list(self.stream_pool.streams.values())
+        stats = [stream.stats() for stream in streams]
+        active = self.stream.stats() if self.stream is not None and self.stream.running else None
+        return {
+            **self.pipeline.collect_metrics(),
+            "open_streams": len(streams),
+            "stream_fps": active["fps"] if active else 0.0,
+            "stream_dropped": sum(s["dropped"] for s in stats),
+            "stream_received": sum(s["received"] for s in stats),
+            "stream_reconnects": sum(s["reconnects"] for s in stats),
+        }
+
+    def close(self):
+        # Chamado pelo main.py ao fechar a janela, depois que os monitores pararam
+        if self.mosaic is not None:
+            mosaic, self.mosaic = self.mosaic, None
+            mosaic.close()
+        self.stream = None
+        self.stream_pool.close_all()
+        self.camera_map.stop()
+        self.pipeline.close()
 
     def start_monitoring(self):
-        self.fetch_camera_names()
-        self.initialize_first_image()
-        threading.Thread(target=self.monitor_folder, daemon=True).start()
+        self.camera_map.start()
         self.root.deiconify()
 
-    def initialize_first_image(self):
-        ip = socket.gethostbyname(socket.gethostname())
-        folder_map = IP_FOLDER_MAPPING
-        folder = folder_map.get(ip, "0000")
-        image_folder = os.path.join(BASE_PATH, folder)
-        if os.path.exists(image_folder):
-            images = [os.path.join(image_folder, f) for f in os.listdir(image_folder) if f.endswith(('.jpg', '.png'))]
-            def sort_key(image):
-                has_def = "[ DEF ]" in os.path.basename(image)
-                return (not has_def, os.path.getmtime(image))
-            images.sort(key=sort_key)
-            if images:
-                self.current_image = images[0]
-                match = re.match(r"(\d{8}-\d{6})_([\d.]+)_(.+)_(\d{4})\.jpg", os.path.basename(self.current_image))
-                if match:
-                    camera_name = match.group(3)
-                    self.current_camera_number = self.camera_map.get(camera_name, "0")
-                    self.stream = VideoStream(self.video_label, f"http://admin:@Dm1n@localhost/mjpegstream.cgi?camera={self.current_camera_number}")
-                    self.stream.start()
-                self.load_thumbnail(self.current_image)
-                self.toggle_thumbnail(None)  # Expande o thumbnail automaticamente
-                self.logger.info(f"Initialized with: {self.current_image}")
-
-    def monitor_folder(self):
-        ip = socket.gethostbyname(socket.gethostname())
-        folder_map = IP_FOLDER_MAPPING
-        folder = folder_map.get(ip, "0000")
-        image_folder = os.path.join(BASE_PATH, folder)
-        last_files = set()
-        
-        while True:
-            if os.path.exists(image_folder) and MainGUI.processing_lock:
-                current_files = set(os.listdir(image_folder))
-                new_files = [f for f in current_files if f.endswith(('.jpg', '.png')) and f not in last_files]
-                if new_files:
-                    images = [os.path.join(image_folder, f) for f in new_files]
-                    def sort_key(image):
-                        has_def = "[ DEF ]" in os.path.basename(image)
-                        return (not has_def, os.path.getmtime(image))
-                    images.sort(key=sort_key)
-                    for image in images:
-                        self.image_queue.put(image)
-                        self.logger.info(f"New image detected: {image}")
-                last_files = current_files
-            time.sleep(1)
-
-    def show_interface(self, image_path):
-        self.logger.info(f"Showing interface for: {image_path}")
+    def show_interface(self, event):
+        self.logger.info(f"Showing interface for: {event.path}")
         self.root.deiconify()
         self.root.attributes('-fullscreen', True)
-        self.load_thumbnail(image_path)
+        self.load_thumbnail(event)
+        self.update_filmstrip()
+
+    def update_filmstrip(self):
+        from PIL import ImageTk
+        for child in self.filmstrip_frame.winfo_children():
+            child.destroy()
+        self.filmstrip_images = []
+        members = self.bursts.members(self.current_event.path) if self.current_event else []
+        if len(members) < 2:
+            self.filmstrip_frame.place_forget()
+            return
+        for member in members[:FILMSTRIP_MAX]:
+            try:
+                snapshot = self.snapshot_cache.get(member.path)
+            except Exception as e:
+                self.logger.error(f"Error loading burst frame {member.path}: {e}")
+                continue
+            photo = ImageTk.PhotoImage(snapshot.thumbnail)
+            self.filmstrip_images.append(photo)  # Mantém referência
+            tk.Label(self.filmstrip_frame, image=photo, bg="black").pack(side=tk.LEFT, padx=2, pady=2)
+        self.filmstrip_frame.place(relx=0.5, rely=0.93, anchor="s")
+        self.filmstrip_frame.lift()
+        self.metadata_label.configure(text=f"{self.current_event.metadata()} | {len(members)} frames")
 
-    def load_thumbnail(self, image_path):
+    def load_thumbnail(self, event):
+        from PIL import ImageTk
         try:
-            img = Image.open(image_path)
-            img.thumbnail((100, 100))
-            self.thumbnail = ImageTk.PhotoImage(img)
+            # Normalmente já decodificado pelo prefetch, sem I/O na thread do Tk
+            snapshot = self.snapshot_cache.get(event.path)
+            self.thumbnail = ImageTk.PhotoImage(snapshot.thumbnail)
             self.thumbnail_label.configure(image=self.thumbnail)
             self.thumbnail_label.image = self.thumbnail  # Mantém referência
-            full_img = Image.open(image_path).resize((self.root.winfo_screenwidth(), self.root.winfo_screenheight()), Image.Resampling.LANCZOS)
-            self.full_image = ImageTk.PhotoImage(full_img)
+            self.full_image = ImageTk.PhotoImage(snapshot.screen)
             self.is_fullscreen = False
-            self.logger.info(f"Thumbnail loaded: {image_path}")
-            filename = os.path.basename(image_path)
-            match = re.match(r"(\d{8}-\d{6})_([\d.]+)_(.+)_(\d{4})\.jpg", filename)
-            if match:
-                date_time = match.group(1).replace("-", " ")
-                ip = match.group(2)
-                camera_name = match.group(3)
-                metadata = f"{camera_name} - {ip} | {date_time[:4]}-{date_time[4:6]}-{date_time[6:11]}:{date_time[11:13]}:{date_time[13:]}"
-                self.metadata_label.configure(text=metadata)
+            self.logger.info(f"Thumbnail loaded: {event.path}")
+            metadata = event.metadata()
+            self.metadata_label.configure(text=metadata)
+            if event.parsed:
                 self.logger.info(f"Metadata displayed: {metadata}")
             else:
-                self.metadata_label.configure(text="Unknown Camera - Unknown IP | Unknown Date")
-                self.logger.warning(f"Could not parse: {filename}")
+                self.logger.warning(f"Could not parse: {event.filename}")
         except Exception as e:
             self.logger.error(f"Error loading thumbnail: {e}")
             self.metadata_label.configure(text="Error loading image")
@@ -185,6 +365,7 @@ class MainGUI:
             self.image_label.lift()
             self.image_label.bind("<Button-1>", self.toggle_thumbnail)
             self.button_frame.lift()
+            self.filmstrip_frame.lift()
             self.is_fullscreen = True
             self.logger.info("Thumbnail expanded")
         elif self.is_fullscreen:
@@ -193,6 +374,8 @@ class MainGUI:
             self.video_label.lift()
             self.thumbnail_label.lift()
             self.button_frame.lift()
+            self.scrub_frame.lift()
+            self.filmstrip_frame.lift()
             self.image_label.unbind("<Button-1>")
             self.is_fullscreen = False
             self.logger.info("Thumbnail minimized")
@@ -201,13 +384,41 @@ class MainGUI:
         if self.log_window is None or not self.log_window.winfo_exists():
             self.log_window = tk.Toplevel(self.root)
             self.log_window.title("Log Window")
-            text = tk.Text(self.log_window, height=20, width=80)
-            text.pack(padx=10, pady=10)
-            with open("logs/app.log", "r") as f:
-                lines = f.readlines()[-100:]
-                text.insert(tk.END, "".join(lines))
-            text.config(state="disabled")
+            self.log_text = tk.Text(self.log_window, height=20, width=80)
+            self.log_text.pack(padx=10, pady=10)
+            try:
+                lines, self.log_position = tail_lines(LOG_PATH, LOG_WINDOW_LINES)
+            except OSError:
+                lines, self.log_position = [], 0
+            self.log_text.insert(tk.END, "".join(lines))
+            self.log_text.see(tk.END)
+            self.log_text.config(state="disabled")
             self.logger.info("Log window opened")
+            self.log_window.after(LOG_WINDOW_REFRESH_MS, self.refresh_log_window)
         else:
             self.log_window.destroy()
-            self.logger.info("Log window closed")
\ No newline at end of file
+            self.logger.info("Log window closed")
+
+    def refresh_log_window(self):
+        if self.log_window is None or not self.log_window.winfo_exists():
+            return
+        try:
+            size = os.path.getsize(LOG_PATH)
+            if size < self.log_position:
+                self.log_position = 0  # Arquivo rotacionado
+            if size > self.log_position:
+                with open(LOG_PATH, "rb") as f:
+                    f.seek(self.log_position)
+                    data = f.read()
+                self.log_position += len(data)
+                self.log_text.config(state="normal")
+                self.log_text.insert(tk.END, data.decode("utf-8", errors="replace"))
+                # Mantém só as últimas linhas no widget
+                extra = int(self.log_text.index("end-1c").split(".")[0]) - LOG_WINDOW_LINES
+                if extra > 0:
+                    self.log_text.delete("1.0", f"{extra + 1}.0")
+                self.log_text.see(tk.END)
+                self.log_text.config(state="disabled")
+        except OSError as e:
+            self.logger.error(f"Error reading log file: {e}")
+        self.log_window.after(LOG_WINDOW_REFRESH_MS, self.refresh_log_window)
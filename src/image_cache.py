@@ -0,0 +1,102 @@
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from config import PREFETCH_WORKERS, SNAPSHOT_CACHE_BYTES
+from logger import get_logger
+from metrics import get_metrics
+
+THUMBNAIL_SIZE = (100, 100)
+
+DecodedSnapshot = namedtuple("DecodedSnapshot", ["thumbnail", "screen", "nbytes"])
+
+class SnapshotCache:
+    def __init__(self, screen_size, max_bytes=SNAPSHOT_CACHE_BYTES, workers=PREFETCH_WORKERS):
+        self.screen_size = screen_size
+        self.max_bytes = max_bytes
+        self.logger = get_logger()
+        self.metrics = get_metrics()
+        self.entries = OrderedDict()
+        # path -> (geração, future); o resultado de uma geração que já não está aqui é descartado
+        self.pending = {}
+        self.generation = 0
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+
+    def __contains__(self, path):
+        with self.lock:
+            return path in self.entries
+
+    def decode(self, path):
+        from PIL import Image
+        with Image.open(path) as img:
+            # Em JPEG o draft faz a decodificação já reduzida (escala DCT)
+            img.draft("RGB", self.screen_size)
+            img = img.convert("RGB")
+        thumbnail = img.copy()
+        thumbnail.thumbnail(THUMBNAIL_SIZE)
+        screen = img.resize(self.screen_size, Image.Resampling.LANCZOS)
+        nbytes = (screen.width * screen.height + thumbnail.width * thumbnail.height) * 3
+        return DecodedSnapshot(thumbnail, screen, nbytes)
+
+    def prefetch(self, paths):
+        with self.lock:
+            for path in paths:
+                if path not in self.entries and path not in self.pending:
+                    self.generation += 1
+                    self.pending[path] = (self.generation, self.executor.submit(self.load, path, self.generation))
+
+    def get(self, path):
+        with self.lock:
+            snapshot = self.entries.get(path)
+            if snapshot is not None:
+                self.entries.move_to_end(path)
+                return snapshot
+            _, future = self.pending.get(path, (None, None))
+        if future is not None:
+            try:
+                return future.result()
+            except CancelledError:
+                pass  # Descartado antes de começar
+        return self.load(path)
+
+    def load(self, path, generation=None):
+        # Um prefetch só guarda o resultado se o caminho não foi descartado enquanto decodificava
+        try:
+            with self.metrics.timer("snapshot_decode"):
+                snapshot = self.decode(path)
+            self.metrics.mark(path, "decoded")
+            with self.lock:
+                if generation is None or self.current(path, generation):
+                    self.store(path, snapshot)
+            return snapshot
+        finally:
+            if generation is not None:
+                with self.lock:
+                    if self.current(path, generation):
+                        del self.pending[path]
+
+    def current(self, path, generation):
+        return self.pending.get(path, (None,))[0] == generation
+
+    def store(self, path, snapshot):
+        old = self.entries.pop(path, None)
+        if old is not None:
+            self.total_bytes -= old.nbytes
+        self.entries[path] = snapshot
+        self.total_bytes += snapshot.nbytes
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.total_bytes -= evicted.nbytes
+
+    def discard(self, path):
+        with self.lock:
+            snapshot = self.entries.pop(path, None)
+            if snapshot is not None:
+                self.total_bytes -= snapshot.nbytes
+            _, future = self.pending.pop(path, (None, None))
+        if future is not None:
+            future.cancel()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -1,15 +1,72 @@
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
+import threading
+import time
+from config import LOG_PATH, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_RATE_WINDOW
+
+_listener = None
+
+class RateLimitFilter(logging.Filter):
+    def __init__(self, window=LOG_RATE_WINDOW, max_keys=1024):
+        super().__init__()
+        self.window = window
+        self.max_keys = max_keys
+        self.seen = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        key = (record.levelno, record.msg)
+        now = time.monotonic()
+        with self.lock:
+            state = self.seen.get(key)
+            if state is not None and now - state[0] < self.window:
+                state[1] += 1
+                return False
+            suppressed = state[1] if state else 0
+            self.seen[key] = [now, 0]
+            if len(self.seen) > self.max_keys:
+                self.seen = {k: v for k, v in self.seen.items() if now - v[0] < self.window}
+        if suppressed:
+            record.msg = f"{record.getMessage()} (suppressed {suppressed} repeats)"
+            record.args = None
+        return True
 
 def setup_logger():
+    global _listener
     logger = logging.getLogger("MotionDetection")
     logger.setLevel(logging.INFO)
-    os.makedirs("logs", exist_ok=True)
-    handler = logging.FileHandler("logs/app.log")
+    if _listener is not None:
+        return logger
+    os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
+    handler = logging.handlers.RotatingFileHandler(LOG_PATH, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
     formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
     handler.setFormatter(formatter)
-    logger.addHandler(handler)
+    # A escrita em disco fica na thread do QueueListener, nunca na captura ou no Tk
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter())
+    logger.addHandler(queue_handler)
+    _listener = logging.handlers.QueueListener(log_queue, handler)
+    _listener.start()
+    atexit.register(_listener.stop)
     return logger
 
 def get_logger():
     return logging.getLogger("MotionDetection")
+
+def tail_lines(path, count, block_size=8192):
+    # Lê de trás para frente só o necessário para as últimas linhas
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        end = position = f.tell()
+        data = b""
+        while position > 0 and data.count(b"\n") <= count:
+            step = min(block_size, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+    lines = data.decode("utf-8", errors="replace").splitlines(keepends=True)
+    return lines[-count:], end
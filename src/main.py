@@ -1,10 +1,15 @@
+from startup_timer import StartupTimer
+startup = StartupTimer()
+
 import tkinter as tk
 from gui import MainGUI
 from folder_monitor import FolderMonitor
-from config import BASE_PATH, IP_FOLDER_MAPPING
+from config import BASE_PATH, IP_FOLDER_MAPPING, LOAD_BALANCE, POOL_FOLDER, SUPERVISOR_FOLDERS
 from logger import setup_logger
+from metrics import get_metrics
 import socket
 import os
+import sys
 
 def get_folder_from_ip():
     try:
@@ -14,19 +19,59 @@ def get_folder_from_ip():
         return "0000"
 
 def main():
+    startup.mark("imports")
     logger = setup_logger()
     logger.info("Starting application")
+    get_metrics().start()
     
-    folder_number = get_folder_from_ip()
-    monitor_path = os.path.join(BASE_PATH, folder_number)
-    logger.info(f"Monitoring folder: {monitor_path}")
+    supervisor = "--supervisor" in sys.argv[1:]
+    if supervisor:
+        folder_numbers = SUPERVISOR_FOLDERS
+    else:
+        # No modo balanceado todas as estações disputam a mesma pasta
+        folder_numbers = [POOL_FOLDER if LOAD_BALANCE else get_folder_from_ip()]
+    monitor_paths = [os.path.join(BASE_PATH, folder_number) for folder_number in folder_numbers]
+    logger.info(f"Monitoring folders: {', '.join(monitor_paths)}")
+    startup.mark("folder lookup")
     
     root = tk.Tk()
-    app = MainGUI(root)
-    monitor = FolderMonitor(monitor_path, app.show_interface)
-    monitor.start()
+    pool_path = monitor_paths[0] if LOAD_BALANCE and not supervisor else None
+    app = MainGUI(root, startup, pool_path=pool_path, folders=monitor_paths if supervisor else None)
+    startup.mark("window")
+    def backlog_indexed(monitor):
+        def on_backlog_indexed():
+            startup.milestone(f"backlog indexed: {monitor.path}")
+            app.on_backlog_indexed(monitor.index, monitor.path)
+        return on_backlog_indexed
+    # Um único observer do watchdog para todas as pastas do supervisor
+    observer = None
+    if supervisor:
+        from watchdog.observers import Observer
+        observer = Observer()
+    monitors = []
+    for monitor_path in monitor_paths:
+        monitor = FolderMonitor(monitor_path, app.enqueue_image, observer=observer, resume=app.resume_from_journal)
+        monitor.on_ready = backlog_indexed(monitor)
+        monitors.append(monitor)
+    for monitor in monitors:
+        monitor.start()
+    startup.mark("monitor")
+    
+    def on_close():
+        # Na ordem: sem eventos novos, streams e trabalhadores parados, decisões gravadas
+        logger.info("Shutting down")
+        for monitor in monitors:
+            monitor.stop()
+        if observer is not None and observer.is_alive():
+            observer.stop()
+            observer.join()
+        app.close()
+        get_metrics().stop()
+        root.destroy()
+    root.protocol("WM_DELETE_WINDOW", on_close)
     
     logger.info("Application initialized")
+    startup.log_breakdown()
     root.mainloop()
 
 if __name__ == "__main__":
@@ -0,0 +1,232 @@
+import bisect
+import http.server
+import json
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from config import METRICS_PORT, METRICS_SUMMARY_INTERVAL, PROFILER_ENABLED, PROFILER_INTERVAL, PROFILER_THREADS
+from logger import get_logger
+
+STAGES = ("detected", "enqueued", "decoded", "displayed", "decided")
+# Limites dos buckets em segundos (escala aproximadamente logarítmica)
+BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 30, 60, 300, 1800)
+MAX_TRACKED_EVENTS = 10000
+
+class Histogram:
+    __slots__ = ("counts", "total", "count", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def percentile(self, fraction):
+        # Estimativa pelo limite superior do bucket
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS + (self.max,), self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 4),
+            "p50": round(self.percentile(0.5), 4),
+            "p90": round(self.percentile(0.9), 4),
+            "p99": round(self.percentile(0.99), 4),
+            "max": round(self.max, 4),
+        }
+
+class Timer:
+    __slots__ = ("metrics", "name", "started")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.started)
+        return False
+
+class Metrics:
+    def __init__(self):
+        self.logger = get_logger()
+        self.counters = Counter()
+        self.gauges = {}
+        self.histograms = {}
+        # Carimbos de tempo por evento até a decisão do operador
+        self.events = OrderedDict()
+        self.collectors = []
+        self.profile = Counter()
+        self.profile_samples = 0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.server = None
+
+    def increment(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def set_gauge(self, name, value):
+        self.gauges[name] = value
+
+    def observe(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def timer(self, name):
+        return Timer(self, name)
+
+    def mark(self, path, stage):
+        now = time.monotonic()
+        with self.lock:
+            stamps = self.events.get(path)
+            if stamps is None:
+                if stage != "detected":
+                    return  # Eventos retomados do journal não têm detecção medida
+                stamps = self.events[path] = {}
+                if len(self.events) > MAX_TRACKED_EVENTS:
+                    self.events.popitem(last=False)
+            stamps.setdefault(stage, now)
+        if stage == "decided":
+            self.finish(path)
+
+    def finish(self, path):
+        with self.lock:
+            stamps = self.events.pop(path, None)
+        if not stamps:
+            return
+        previous = None
+        for stage in STAGES:
+            if stage not in stamps:
+                continue
+            if previous is not None:
+                self.observe(f"{previous}->{stage}", stamps[stage] - stamps[previous])
+            previous = stage
+        if "displayed" in stamps:
+            self.observe("detected->displayed", stamps["displayed"] - stamps["detected"])
+
+    def add_collector(self, collector):
+        # Funções chamadas a cada leitura; devolvem um dict de gauges
+        self.collectors.append(collector)
+
+    def snapshot(self):
+        gauges = dict(self.gauges)
+        for collector in self.collectors:
+            try:
+                gauges.update(collector())
+            except Exception as e:
+                self.logger.error(f"Error collecting metrics: {e}")
+        with self.lock:
+            return {
+                "counters": dict(self.counters),
+                "gauges": gauges,
+                "histograms": {name: histogram.snapshot() for name, histogram in self.histograms.items()},
+                "in_flight": len(self.events),
+            }
+
+    def summary(self):
+        data = self.snapshot()
+        latency = data["histograms"].get("detected->displayed", {})
+        parts = [f"in flight {data['in_flight']}"]
+        if latency.get("count"):
+            parts.append(f"detected->displayed p50 {latency['p50']}s p90 {latency['p90']}s ({latency['count']} events)")
+        parts.extend(f"{name} {value}" for name, value in sorted(data["gauges"].items()))
+        parts.extend(f"{name} {value}" for name, value in sorted(data["counters"].items()))
+        return ", ".join(parts)
+
+    def summary_loop(self, interval):
+        while not self.stop_event.wait(interval):
+            self.logger.info(f"Metrics: {self.summary()}")
+
+    def profile_snapshot(self, limit=50):
+        with self.lock:
+            return {"samples": self.profile_samples, "top": [[frame, count] for frame, count in self.profile.most_common(limit)]}
+
+    def profile_loop(self, interval, thread_names):
+        # Amostragem das pilhas das threads de captura e do Tk; ativada só por configuração
+        while not self.stop_event.wait(interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            frames = sys._current_frames()
+            with self.lock:
+                self.profile_samples += 1
+                for ident, frame in frames.items():
+                    name = names.get(ident, "")
+                    if not name.startswith(thread_names):
+                        continue
+                    stack = []
+                    while frame is not None and len(stack) < 8:
+                        stack.append(f"{frame.f_code.co_name}:{frame.f_lineno}")
+                        frame = frame.f_back
+                    self.profile[f"{name.split('-')[0]};{';'.join(reversed(stack))}"] += 1
+
+    def serve(self, port):
+        metrics = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    data = metrics.snapshot()
+                elif self.path == "/profile":
+                    data = metrics.profile_snapshot()
+                else:
+                    self.send_error(404)
+                    return
+                body = json.dumps(data, default=str).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        # Só na interface local: o endpoint não tem autenticação
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.logger.info(f"Metrics endpoint on http://127.0.0.1:{self.server.server_address[1]}/metrics")
+
+    def start(self, port=METRICS_PORT, summary_interval=METRICS_SUMMARY_INTERVAL, profiler=PROFILER_ENABLED):
+        if port is not None:
+            try:
+                self.serve(port)
+            except OSError as e:
+                self.logger.error(f"Could not start metrics endpoint on port {port}: {e}")
+        if summary_interval:
+            threading.Thread(target=self.summary_loop, args=(summary_interval,), daemon=True).start()
+        if profiler:
+            threading.Thread(target=self.profile_loop, args=(PROFILER_INTERVAL, PROFILER_THREADS), daemon=True).start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.server is not None:
+            self.server.shutdown()
+
+_metrics = Metrics()
+
+def get_metrics():
+    return _metrics
@@ -0,0 +1,182 @@
+import base64
+import re
+import select
+import socket
+import sys
+import time
+from urllib.parse import urlsplit
+import cv2
+import numpy as np
+from config import MJPEG_BUFFER_SIZE, MJPEG_MAX_BUFFER_SIZE, STREAM_OPEN_TIMEOUT, STREAM_READ_TIMEOUT
+from logger import get_logger
+
+HEADER_END = b"\r\n\r\n"
+SOI = b"\xff\xd8"
+EOI = b"\xff\xd9"
+CONTENT_LENGTH = re.compile(rb"content-length:\s*(\d+)", re.IGNORECASE)
+MAX_FILLS_PER_READ = 64
+
+class MjpegReader:
+    # Interface compatível com cv2.VideoCapture (isOpened/read/release).
+    # O buffer é linear e compactado, não um anel: recv_into e imdecode trabalham direto nele, sem cópia,
+    # e só quando o fim é alcançado a parte ainda não consumida (em geral menos de um quadro) volta ao início
+    def __init__(self, url, buffer_size=MJPEG_BUFFER_SIZE, open_timeout=STREAM_OPEN_TIMEOUT, read_timeout=STREAM_READ_TIMEOUT, on_frame=None, max_buffer_size=MJPEG_MAX_BUFFER_SIZE):
+        self.url = url
+        self.max_buffer_size = max(buffer_size, max_buffer_size)
+        # Recebe cada JPEG completo, inclusive os pulados, antes de qualquer decodificação
+        self.on_frame = on_frame
+        self.open_timeout = open_timeout
+        self.read_timeout = read_timeout
+        self.logger = get_logger()
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+        self.sock = None
+        self.frames_decoded = 0
+        self.frames_skipped = 0
+
+    def open(self):
+        parts = urlsplit(self.url)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        request = [f"GET {path} HTTP/1.0", f"Host: {parts.hostname}"]
+        if parts.username is not None:
+            credentials = f"{parts.username}:{parts.password or ''}".encode()
+            request.append(f"Authorization: Basic {base64.b64encode(credentials).decode()}")
+        try:
+            self.sock = socket.create_connection((parts.hostname, parts.port or 80), timeout=self.open_timeout)
+            self.sock.sendall(("\r\n".join(request) + "\r\n\r\n").encode())
+            self.sock.settimeout(self.read_timeout)
+            while self.buffer.find(HEADER_END, 0, self.end) == -1:
+                if not self.fill():
+                    raise ConnectionError("connection closed before response headers")
+            header_end = self.buffer.find(HEADER_END, 0, self.end)
+            status = bytes(self.buffer[:self.buffer.find(b"\r\n", 0, header_end)]).decode("latin-1")
+            if " 200" not in status:
+                raise ConnectionError(status)
+            self.start = header_end + len(HEADER_END)
+            return True
+        except OSError as e:
+            self.logger.error(f"Failed to open MJPEG stream {self.url}: {e}")
+            self.release()
+            return False
+
+    def isOpened(self):
+        return self.sock is not None
+
+    def release(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        self.start = self.end = 0
+
+    def fill(self, keep_from=None):
+        keep_from = self.start if keep_from is None else keep_from
+        if self.end == len(self.buffer):
+            if keep_from == 0:
+                # Quadro maior que o buffer: dobra até o limite (a view precisa ser solta antes).
+                # No limite, o stream não tem quadro completo e a falha leva à reconexão
+                if len(self.buffer) >= self.max_buffer_size:
+                    raise ConnectionError(f"no complete frame in {len(self.buffer)} bytes")
+                self.view.release()
+                self.buffer.extend(bytes(min(len(self.buffer), self.max_buffer_size - len(self.buffer))))
+                self.view = memoryview(self.buffer)
+            else:
+                # Compactação: move para o início só o que ainda não foi consumido (um memmove por volta no buffer)
+                remaining = self.end - keep_from
+                self.buffer[:remaining] = self.view[keep_from:self.end]
+                self.start -= keep_from
+                self.end = remaining
+        try:
+            received = self.sock.recv_into(self.view[self.end:])
+        except (socket.timeout, OSError):
+            return False
+        if received == 0:
+            return False
+        self.end += received
+        return True
+
+    def next_frame(self):
+        # Retorna (offset, tamanho) do próximo JPEG completo no buffer
+        header_end = self.buffer.find(HEADER_END, self.start, self.end)
+        if header_end != -1:
+            match = CONTENT_LENGTH.search(self.buffer, self.start, header_end)
+            if match:
+                body = header_end + len(HEADER_END)
+                length = int(match.group(1))
+                if self.end - body < length:
+                    return None
+                self.start = body + length
+                return body, length
+        soi = self.buffer.find(SOI, self.start, self.end)
+        if soi == -1:
+            return None
+        eoi = self.buffer.find(EOI, soi + 2, self.end)
+        if eoi == -1:
+            return None
+        self.start = eoi + 2
+        return soi, eoi + 2 - soi
+
+    def pending(self):
+        return bool(select.select([self.sock], [], [], 0)[0])
+
+    def read(self, flags=cv2.IMREAD_COLOR):
+        if self.sock is None:
+            return False, None
+        latest = None
+        for _ in range(MAX_FILLS_PER_READ):
+            frame = self.next_frame()
+            while frame is not None:
+                if self.on_frame is not None:
+                    self.on_frame(self.view[frame[0]:frame[0] + frame[1]])
+                if latest is not None:
+                    self.frames_skipped += 1
+                latest = frame
+                frame = self.next_frame()
+            # Só decodifica quando não há dados mais novos esperando no socket
+            if latest is not None and not self.pending():
+                break
+            keep_from = latest[0] if latest is not None else None
+            before = self.start
+            if not self.fill(keep_from):
+                if latest is None:
+                    return False, None
+                break
+            if latest is not None and self.start != before:
+                shift = before - self.start
+                latest = (latest[0] - shift, latest[1])
+        if latest is None:
+            return False, None
+        offset, length = latest
+        data = np.frombuffer(self.buffer, dtype=np.uint8, count=length, offset=offset)
+        frame = cv2.imdecode(data, flags)
+        if frame is None:
+            return False, None
+        self.frames_decoded += 1
+        return True, frame
+
+def benchmark(url, seconds=10):
+    results = {}
+    for name, cap in (("mjpeg", MjpegReader(url)), ("opencv", cv2.VideoCapture(url))):
+        if isinstance(cap, MjpegReader):
+            cap.open()
+        if not cap.isOpened():
+            results[name] = None
+            continue
+        frames = 0
+        cpu_started, started = time.process_time(), time.perf_counter()
+        while time.perf_counter() - started < seconds:
+            ret, _ = cap.read()
+            frames += ret
+        elapsed = time.perf_counter() - started
+        results[name] = {"fps": frames / elapsed, "cpu_per_frame_ms": 1000 * (time.process_time() - cpu_started) / max(1, frames)}
+        if isinstance(cap, MjpegReader):
+            results[name]["skipped"] = cap.frames_skipped
+        cap.release()
+    return results
+
+if __name__ == "__main__":
+    for backend, result in benchmark(sys.argv[1], float(sys.argv[2]) if len(sys.argv) > 2 else 10).items():
+        print(backend, result)
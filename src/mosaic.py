@@ -0,0 +1,112 @@
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+from config import DISPLAY_FPS, MOSAIC_MAX_TILES, MOSAIC_TILE_FPS, MOSAIC_WORKERS
+from logger import get_logger
+
+class MosaicView:
+    def __init__(self, label, stream_pool, on_promote, tile_fps=MOSAIC_TILE_FPS, workers=MOSAIC_WORKERS):
+        self.label = label
+        self.stream_pool = stream_pool
+        self.on_promote = on_promote
+        self.tile_interval = 1.0 / tile_fps
+        self.refresh_interval = max(1, int(1000 / DISPLAY_FPS))
+        self.logger = get_logger()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mosaic")
+        self.cameras = []
+        self.streams = []
+        self.canvas = None
+        # O compositor escreve no canvas; o Tk só copia para o PhotoImage
+        self.canvas_lock = threading.Lock()
+        self.canvas_seq = 0
+        self.shown_seq = 0
+        self.photo = None
+        self.after_id = None
+        self.stop_event = threading.Event()
+
+    def show(self, camera_numbers):
+        self.cameras = list(camera_numbers)[:MOSAIC_MAX_TILES]
+        self.columns = math.ceil(math.sqrt(len(self.cameras)))
+        self.rows = math.ceil(len(self.cameras) / self.columns)
+        width, height = max(self.label.winfo_width(), 320), max(self.label.winfo_height(), 240)
+        self.tile_size = (width // self.columns, height // self.rows)
+        self.canvas = np.zeros((height, width, 3), dtype=np.uint8)
+        self.streams = self.stream_pool.pin(self.cameras)
+        for stream in self.streams:
+            # A captura já entrega o quadro reduzido ao tamanho do bloco
+            stream.target_size = self.tile_size
+        self.tiles = [np.empty((self.tile_size[1], self.tile_size[0], 3), dtype=np.uint8) for _ in self.streams]
+        self.tile_seqs = [0] * len(self.streams)
+        self.tile_times = [0.0] * len(self.streams)
+        self.label.bind("<Button-1>", self.promote)
+        threading.Thread(target=self.compose_loop, daemon=True).start()
+        self.refresh()
+        self.logger.info(f"Mosaic opened with cameras: {', '.join(self.cameras)}")
+
+    def render_tile(self, index):
+        stream = self.streams[index]
+        now = time.monotonic()
+        if now - self.tile_times[index] < self.tile_interval:
+            return False
+        with stream.latest_frame() as (frame, seq):
+            if frame is None or seq == self.tile_seqs[index]:
+                return False
+            tile_width, tile_height = self.tile_size
+            height, width = frame.shape[:2]
+            scale = min(tile_width / width, tile_height / height)
+            size = (max(1, int(width * scale)), max(1, int(height * scale)))
+            x = (index % self.columns) * tile_width + (tile_width - size[0]) // 2
+            y = (index // self.columns) * tile_height + (tile_height - size[1]) // 2
+            # Redimensiona num bloco pré-alocado; só vai para o canvas se a captura não sobrescreveu o quadro no meio
+            tile = self.tiles[index][:size[1], :size[0]]
+            cv2.resize(frame, size, dst=tile, interpolation=cv2.INTER_AREA)
+            if not stream.intact(seq):
+                return False
+            self.canvas[y:y + size[1], x:x + size[0]] = tile
+        self.tile_seqs[index] = seq
+        self.tile_times[index] = now
+        return True
+
+    def compose_loop(self):
+        while not self.stop_event.wait(self.refresh_interval / 1000):
+            with self.canvas_lock:
+                results = list(self.executor.map(self.render_tile, range(len(self.streams))))
+                if any(results):
+                    self.canvas_seq += 1
+
+    def refresh(self):
+        if self.stop_event.is_set():
+            return
+        if self.canvas_seq != self.shown_seq:
+            with self.canvas_lock:
+                self.shown_seq = self.canvas_seq
+                img = Image.fromarray(self.canvas)
+                if self.photo is None:
+                    self.photo = ImageTk.PhotoImage(image=img)
+                    self.label.configure(image=self.photo)
+                    self.label.image = self.photo
+                else:
+                    self.photo.paste(img)
+        self.after_id = self.label.after(self.refresh_interval, self.refresh)
+
+    def promote(self, event):
+        column = min(event.x // self.tile_size[0], self.columns - 1)
+        row = min(event.y // self.tile_size[1], self.rows - 1)
+        index = row * self.columns + column
+        if index < len(self.cameras):
+            self.logger.info(f"Mosaic tile promoted: camera {self.cameras[index]}")
+            self.on_promote(self.cameras[index])
+
+    def close(self):
+        self.stop_event.set()
+        if self.after_id is not None:
+            self.label.after_cancel(self.after_id)
+            self.after_id = None
+        self.label.unbind("<Button-1>")
+        self.executor.shutdown(wait=False)
+        self.stream_pool.unpin()
+        self.logger.info("Mosaic closed")
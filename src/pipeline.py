@@ -0,0 +1,286 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from queue import Empty
+from bursts import BurstGrouper
+from camera_map import CameraMap
+from config import ARCHIVE_PATH, ACTION_JOURNAL, BURST_HASH_WORKERS, EVENT_JOURNAL, FIRST_DISPLAY_BATCH, FIRST_DISPLAY_WAIT, PREFETCH_COUNT, PREFILTER_ENABLED, PREFILTER_ACTION
+from event_journal import EventJournal
+from event_queue import EventQueue, FolderScheduler, PRIORITY_LOW
+from file_actions import FileActionWorker, DELETE
+from image_cache import SnapshotCache
+from logger import get_logger
+from metrics import get_metrics
+from snapshot import SnapshotParser
+from suppression import SuppressionRules
+from work_pool import WorkPool
+
+class EventPipeline:
+    # Caminho de um evento sem o Tk: detecção -> supressão -> pré-filtro -> rajadas -> fila -> exibição -> decisão.
+    # A interface e o benchmark usam a mesma instância; os ganchos on_* avisam quem exibe
+    def __init__(self, screen_size, camera_map=None, pool_path=None, folders=None, journal_path=EVENT_JOURNAL, archive_path=ARCHIVE_PATH, action_journal=ACTION_JOURNAL):
+        self.logger = get_logger()
+        self.metrics = get_metrics()
+        self.on_queued = None
+        self.on_burst_grown = None
+        self.on_current_lost = None
+        self.bursts = BurstGrouper()
+        # dhash lê a imagem no compartilhamento; a thread do observer é compartilhada por todas as pastas
+        self.hasher = ThreadPoolExecutor(max_workers=BURST_HASH_WORKERS, thread_name_prefix="burst-hash")
+        self.journal = EventJournal(journal_path)
+        self.file_actions = FileActionWorker(archive_path, action_journal, on_done=self.on_file_action_done)
+        self.suppression = SuppressionRules(self.on_suppression_release, self.on_suppression_drop)
+        self.prefilter = None
+        if PREFILTER_ENABLED:
+            from prefilter import MotionPrefilter
+            self.prefilter = MotionPrefilter(self.on_prefilter_result)
+        self.camera_map = camera_map or CameraMap()
+        # Modo supervisor: uma fila por pasta, intercaladas de forma justa
+        self.folders = folders
+        self.image_queue = FolderScheduler(folders) if folders else EventQueue()
+        self.parser = SnapshotParser(self.camera_map)
+        self.current = None
+        # A primeira exibição espera um lote curto (ou o primeiro DEF) para mostrar o melhor evento dele
+        self.first_released = False
+        self.first_batch = 0
+        self.first_timer = None
+        self.lock = threading.Lock()
+        self.snapshot_cache = SnapshotCache(screen_size)
+        self.work_pool = None
+        if pool_path:
+            self.work_pool = WorkPool(pool_path, depth=self.image_queue.qsize, on_claimed=self.accept_image, give_back=self.give_back, on_lost=self.drop_lost)
+
+    def start(self):
+        self.file_actions.start()
+        if self.work_pool is not None:
+            self.work_pool.start()
+
+    def enqueue_image(self, image_path):
+        # Chamado pelas threads do FolderMonitor
+        if self.work_pool is not None and not self.work_pool.claim(image_path):
+            return
+        self.accept_image(image_path)
+
+    def accept_image(self, image_path):
+        event = self.parser.parse(image_path)
+        self.journal.record_arrival(event)
+        # A supressão é decidida antes de qualquer leitura da imagem
+        if self.suppression.admit(event):
+            self.route_event(event)
+
+    def route_event(self, event):
+        if self.prefilter is not None and not event.is_def:
+            self.prefilter.submit(event)
+        else:
+            self.queue_event(event)
+
+    def on_prefilter_result(self, event, ratio, quiet):
+        # Chamado pelas threads do pré-filtro
+        if not quiet:
+            self.queue_event(event)
+        elif PREFILTER_ACTION == "dismiss":
+            self.logger.info(f"Auto-dismissed {event.path}: changed area {ratio:.2%}")
+            self.file_actions.submit(DELETE, [event.path], "auto-dismiss")
+            self.journal.record_decision([event.path], "auto-dismiss")
+            self.metrics.mark(event.path, "decided")
+        else:
+            self.logger.info(f"Deprioritized {event.path}: changed area {ratio:.2%}")
+            self.queue_event(event, PRIORITY_LOW)
+
+    def queue_event(self, event, priority=None):
+        if self.bursts.needs_hash(event):
+            self.hasher.submit(self.group_event, event, priority)
+        else:
+            self.place_event(event, self.bursts.add(event, read=False), priority)
+
+    def group_event(self, event, priority):
+        # Roda no pool de hashes
+        try:
+            burst = self.bursts.add(event)
+        except Exception as e:
+            self.logger.error(f"Error hashing {event.path}: {e}")
+            burst = self.bursts.add(event, read=False)
+        self.place_event(event, burst, priority)
+
+    def place_event(self, event, burst, priority=None):
+        self.metrics.mark(event.path, "enqueued")
+        if burst is not None:
+            self.logger.info(f"Grouped {event.filename} into burst of {burst.leader.filename} ({len(burst.members)} frames)")
+            self.snapshot_cache.prefetch([event.path])
+            current = self.current
+            if current is not None and current.path == burst.leader.path and self.on_burst_grown:
+                self.on_burst_grown(burst)
+            return
+        self.image_queue.put(event, priority)
+        if self.current is None:
+            self.hold_first(event)
+        elif len(self.image_queue) <= PREFETCH_COUNT:
+            self.snapshot_cache.prefetch([event.path])
+
+    def hold_first(self, event):
+        with self.lock:
+            if not self.first_released:
+                self.first_batch += 1
+                if self.first_timer is None:
+                    self.first_timer = threading.Timer(FIRST_DISPLAY_WAIT, self.release_first)
+                    self.first_timer.daemon = True
+                    self.first_timer.start()
+                if not event.is_def and self.first_batch < FIRST_DISPLAY_BATCH:
+                    return
+        self.release_first()
+
+    def release_first(self):
+        with self.lock:
+            self.first_released = True
+            if self.first_timer is not None:
+                self.first_timer.cancel()
+        if self.on_queued and not self.image_queue.empty():
+            self.on_queued()
+
+    def on_suppression_drop(self, events):
+        paths = [event.path for event in events]
+        for path in paths:
+            self.snapshot_cache.discard(path)
+        # O motivo separa no pack o descarte automático da decisão do operador
+        self.file_actions.submit(DELETE, paths, "suppressed")
+        self.journal.record_decision(paths, "suppressed")
+        for path in paths:
+            self.metrics.mark(path, "decided")
+
+    def on_suppression_release(self, events):
+        # Chamado pela thread de vencimento das regras
+        for event in events:
+            self.route_event(event)
+
+    def inhibit(self, camera, seconds):
+        self.suppression.inhibit(camera, seconds)
+        # Descarta também o que já está na fila dessa câmera
+        queued = [event for event in self.image_queue.peek(len(self.image_queue)) if event.camera_name == camera]
+        dropped = []
+        for event in queued:
+            if self.image_queue.remove(event.path):
+                dropped.extend(self.bursts.resolve(event))
+        if dropped:
+            self.on_suppression_drop(dropped)
+
+    def pause(self, seconds):
+        self.suppression.pause_all(seconds)
+
+    def resume_from_journal(self, folder):
+        # Retoma os eventos pendentes sem esperar a listagem da pasta
+        paths = [path for path in self.journal.pending_paths() if os.path.dirname(path) == folder]
+        for path in paths:
+            self.enqueue_image(path)
+        if paths:
+            self.logger.info(f"Resumed {len(paths)} pending events from journal")
+        return paths
+
+    def on_backlog_indexed(self, index, folder=None):
+        # Chamado após a primeira varredura: descarta retomados que já não existem
+        missing = []
+        for event in self.image_queue.peek(len(self.image_queue)):
+            if folder is not None and os.path.dirname(event.path) != folder:
+                continue
+            if event.filename not in index and self.image_queue.remove(event.path):
+                missing.extend(member.path for member in self.bursts.resolve(event))
+        if missing:
+            self.journal.record_decision(missing, "missing")
+            self.logger.info(f"Dropped {len(missing)} resumed events no longer in the folder")
+        self.release_first()
+
+    def give_back(self, count):
+        # Chamado pelo WorkPool: devolve os eventos menos prioritários da fila local
+        paths = []
+        for event in self.image_queue.tail(count):
+            if self.image_queue.remove(event.path):
+                for member in self.bursts.resolve(event):
+                    self.snapshot_cache.discard(member.path)
+                    paths.append(member.path)
+        return paths
+
+    def drop_lost(self, paths):
+        # Chamado pelo WorkPool: outra estação assumiu esses eventos; saem da fila e das rajadas
+        lost = set(paths)
+        members = []
+        for path in paths:
+            if self.image_queue.remove(path):
+                members.extend(self.bursts.resolve(self.parser.parse(path)))
+            elif self.bursts.discard_member(path):
+                self.snapshot_cache.discard(path)
+        self.hand_back(members, lost)
+        current = self.current
+        if current is not None and current.path in lost and self.on_current_lost:
+            self.on_current_lost(current)
+
+    def skip(self, event):
+        # Deixa o evento exibido sem decisão (assumido por outra estação)
+        if self.current is not event:
+            return False
+        self.logger.info(f"Skipping {event.path}: taken over by another station")
+        self.hand_back(self.bursts.resolve(event), {event.path})
+        self.current = None
+        return True
+
+    def hand_back(self, members, lost):
+        # Os demais membros da rajada ainda têm lease nosso: voltam ao pool em vez de ficarem presos até o fim da sessão
+        for member in members:
+            self.snapshot_cache.discard(member.path)
+        remaining = [member.path for member in members if member.path not in lost]
+        if remaining and self.work_pool is not None:
+            self.work_pool.hand_back(remaining)
+
+    def on_file_action_done(self, action):
+        # O lease só é liberado depois que o arquivo saiu do pool
+        if self.work_pool is not None:
+            self.work_pool.complete(action.paths)
+
+    def next_event(self, block=False, timeout=None):
+        # Próximo evento a exibir; None se ainda há um em exibição ou a fila está vazia
+        if self.current is not None:
+            return None
+        try:
+            self.current = self.image_queue.get(block, timeout)
+        except Empty:
+            return None
+        self.journal.record_display(self.current.path)
+        self.snapshot_cache.prefetch(event.path for event in self.image_queue.peek(PREFETCH_COUNT))
+        return self.current
+
+    def displayed(self, event):
+        self.metrics.mark(event.path, "displayed")
+
+    def resolve(self, action, reason=None):
+        if self.current is None:
+            return []
+        # Uma decisão resolve a rajada inteira; o arquivo é tratado em segundo plano
+        members = self.bursts.resolve(self.current)
+        paths = [event.path for event in members]
+        self.file_actions.submit(action, paths, reason)
+        self.journal.record_decision(paths, action, reason)
+        for event in members:
+            self.snapshot_cache.discard(event.path)
+            self.metrics.mark(event.path, "decided")
+        self.logger.info(f"Decision {action} for {self.current.path} ({len(members)} files){f': {reason}' if reason else ''}")
+        self.current = None
+        return members
+
+    def collect_metrics(self):
+        suppression = self.suppression.stats()
+        return {
+            "queue_depth": len(self.image_queue),
+            "snapshot_cache_bytes": self.snapshot_cache.total_bytes,
+            "suppression_held": suppression["held"],
+            **{f"suppressed_{camera or 'unparsed'}": count for camera, count in suppression["suppressed"].items()},
+            **{f"backlog_{os.path.basename(folder)}": count for folder, count in (self.image_queue.backlog().items() if self.folders else ())},
+        }
+
+    def close(self):
+        # Na ordem: para de produzir, aplica as decisões prontas (e libera os leases), grava o journal
+        if self.prefilter is not None:
+            self.prefilter.shutdown()
+        self.hasher.shutdown(wait=False, cancel_futures=True)
+        self.snapshot_cache.shutdown()
+        self.file_actions.stop()
+        if self.work_pool is not None:
+            self.work_pool.stop()
+        self.journal.close()
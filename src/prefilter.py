@@ -0,0 +1,54 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from config import PREFILTER_THRESHOLD, PREFILTER_PIXEL_DELTA, PREFILTER_ALPHA, PREFILTER_SIZE, PREFILTER_WORKERS
+from logger import get_logger
+
+class MotionPrefilter:
+    def __init__(self, on_result, threshold=PREFILTER_THRESHOLD, pixel_delta=PREFILTER_PIXEL_DELTA, alpha=PREFILTER_ALPHA, workers=PREFILTER_WORKERS):
+        self.on_result = on_result
+        self.threshold = threshold
+        self.pixel_delta = pixel_delta
+        self.alpha = alpha
+        self.logger = get_logger()
+        # Modelo de fundo por câmera (média móvel em float32, resolução reduzida)
+        self.backgrounds = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefilter")
+
+    def submit(self, event):
+        self.executor.submit(self.analyze, event)
+
+    def load(self, path):
+        # Decodificação JPEG já reduzida a 1/8; só o necessário para a comparação
+        gray = cv2.imread(path, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+        if gray is None:
+            return None
+        gray = cv2.resize(gray, PREFILTER_SIZE, interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def changed_ratio(self, camera, gray):
+        with self.lock:
+            background = self.backgrounds.get(camera)
+            if background is None:
+                self.backgrounds[camera] = gray.astype(np.float32)
+                return None
+            diff = cv2.absdiff(gray, cv2.convertScaleAbs(background))
+            ratio = np.count_nonzero(diff > self.pixel_delta) / float(diff.size)
+            cv2.accumulateWeighted(gray, background, self.alpha)
+        return ratio
+
+    def analyze(self, event):
+        ratio = None
+        try:
+            gray = self.load(event.path)
+            if gray is not None:
+                ratio = self.changed_ratio(event.camera_name or "", gray)
+        except Exception as e:
+            self.logger.error(f"Error analyzing {event.path}: {e}")
+        # Sem referência ou com erro, o evento segue normalmente
+        self.on_result(event, ratio, ratio is not None and ratio < self.threshold)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,63 @@
+import os
+import re
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+
+SNAPSHOT_PATTERN = re.compile(r"(\d{8}-\d{6})_([\d.]+)_(.+)_(\d{4})\.(?:jpg|png)$", re.IGNORECASE)
+DEF_FLAG = "[ DEF ]"
+
+class SnapshotEvent(namedtuple("SnapshotEvent", ["path", "filename", "timestamp", "ip", "camera_name", "sequence", "is_def", "camera_number"])):
+    __slots__ = ()
+
+    @property
+    def parsed(self):
+        return self.timestamp is not None
+
+    @property
+    def epoch(self):
+        return self.timestamp.timestamp() if self.timestamp else None
+
+    def metadata(self):
+        if not self.parsed:
+            return "Unknown Camera - Unknown IP | Unknown Date"
+        return f"{self.camera_name} - {self.ip} | {self.timestamp:%Y-%m-%d %H:%M:%S}"
+
+class SnapshotParser:
+    def __init__(self, camera_map, maxsize=4096):
+        self.camera_map = camera_map
+        self.maxsize = maxsize
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def parse(self, path):
+        with self.lock:
+            event = self.cache.get(path)
+            if event is not None:
+                self.cache.move_to_end(path)
+                return event
+        event = self._parse(path)
+        with self.lock:
+            self.cache[path] = event
+            if len(self.cache) > self.maxsize:
+                self.cache.popitem(last=False)
+        return event
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+
+    def _parse(self, path):
+        filename = os.path.basename(path)
+        is_def = DEF_FLAG in filename
+        match = SNAPSHOT_PATTERN.match(filename)
+        if not match:
+            return SnapshotEvent(path, filename, None, None, None, None, is_def, None)
+        stamp, ip, camera_name, sequence = match.groups()
+        camera_name = camera_name.replace(DEF_FLAG, "").strip()
+        try:
+            timestamp = datetime.strptime(stamp, "%Y%m%d-%H%M%S")
+        except ValueError:
+            return SnapshotEvent(path, filename, None, None, None, None, is_def, None)
+        camera_number = self.camera_map.lookup(camera_name)
+        return SnapshotEvent(path, filename, timestamp, ip, camera_name, int(sequence), is_def, camera_number)
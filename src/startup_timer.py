@@ -0,0 +1,28 @@
+import threading
+import time
+from logger import get_logger
+
+class StartupTimer:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.last = self.started
+        self.stages = []
+        self.reported = set()
+        self.lock = threading.Lock()
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.stages.append((stage, now - self.last))
+        self.last = now
+
+    def log_breakdown(self):
+        breakdown = ", ".join(f"{stage} {elapsed:.3f}s" for stage, elapsed in self.stages)
+        get_logger().info(f"Startup: {breakdown} (window shown after {self.last - self.started:.3f}s)")
+
+    def milestone(self, name):
+        # Marcos assíncronos (primeiro evento, backlog indexado) são registrados uma única vez
+        with self.lock:
+            if name in self.reported:
+                return
+            self.reported.add(name)
+        get_logger().info(f"Startup: {name} after {time.perf_counter() - self.started:.3f}s")
@@ -0,0 +1,119 @@
+import threading
+import time
+from collections import OrderedDict
+from config import STREAM_URL, STREAM_POOL_SIZE, STREAM_IDLE_TIMEOUT
+from logger import get_logger
+
+class StreamPool:
+    def __init__(self, url_template=STREAM_URL, max_streams=STREAM_POOL_SIZE, idle_timeout=STREAM_IDLE_TIMEOUT):
+        self.url_template = url_template
+        self.max_streams = max_streams
+        self.idle_timeout = idle_timeout
+        self.logger = get_logger()
+        self.streams = OrderedDict()
+        self.idle_since = {}
+        self.active = None
+        self.active_camera = None
+        # Câmeras fixadas (mosaico) não são despejadas nem fechadas por ociosidade
+        self.pinned = set()
+        self.lock = threading.RLock()
+        self.stop_event = threading.Event()
+        threading.Thread(target=self.reap_loop, daemon=True).start()
+
+    def open(self, camera_number):
+        stream = self.streams.pop(camera_number, None)
+        if stream is None or not stream.running:
+            # Importação tardia: cv2 e numpy só carregam no primeiro stream
+            from video_stream import VideoStream
+            stream = VideoStream(None, self.url_template.format(camera=camera_number))
+            stream.start()
+        self.streams[camera_number] = stream
+        return stream
+
+    def acquire(self, camera_number, label):
+        with self.lock:
+            hit = camera_number in self.streams and self.streams[camera_number].running
+            stream = self.open(camera_number)
+            if self.active is not None and self.active is not stream:
+                self.active.detach()
+                if self.active_camera not in self.pinned:
+                    self.idle_since[self.active_camera] = time.monotonic()
+            self.idle_since.pop(camera_number, None)
+            self.active = stream
+            self.active_camera = camera_number
+            stream.attach(label)
+            self.evict()
+        self.logger.info(f"Stream for camera {camera_number} {'reused from pool' if hit else 'opened'}")
+        return stream
+
+    def release_active(self):
+        # Desliga o stream em exibição da tela; ele fica no pool como ocioso
+        with self.lock:
+            if self.active is None:
+                return
+            self.active.detach()
+            if self.active_camera not in self.pinned:
+                self.idle_since[self.active_camera] = time.monotonic()
+            self.active = None
+            self.active_camera = None
+
+    def prewarm(self, camera_numbers):
+        with self.lock:
+            for camera_number in camera_numbers:
+                stream = self.open(camera_number)
+                if stream is not self.active and camera_number not in self.pinned:
+                    self.idle_since.setdefault(camera_number, time.monotonic())
+            self.evict()
+
+    def pin(self, camera_numbers):
+        with self.lock:
+            streams = []
+            for camera_number in camera_numbers:
+                streams.append(self.open(camera_number))
+                self.idle_since.pop(camera_number, None)
+                self.pinned.add(camera_number)
+            return streams
+
+    def unpin(self):
+        with self.lock:
+            now = time.monotonic()
+            for camera_number in self.pinned:
+                if camera_number in self.streams and self.streams[camera_number] is not self.active:
+                    self.idle_since[camera_number] = now
+            self.pinned.clear()
+            self.evict()
+
+    def evict(self):
+        # LRU: descarta os streams menos usados, nunca o que está em exibição
+        for camera_number in list(self.streams):
+            if len(self.streams) <= self.max_streams:
+                break
+            if self.streams[camera_number] is not self.active and camera_number not in self.pinned:
+                self.close(camera_number)
+
+    def close(self, camera_number):
+        stream = self.streams.pop(camera_number)
+        self.idle_since.pop(camera_number, None)
+        stream.stop()
+
+    def reap_loop(self):
+        while not self.stop_event.wait(self.idle_timeout / 4):
+            now = time.monotonic()
+            with self.lock:
+                for camera_number, since in list(self.idle_since.items()):
+                    if now - since > self.idle_timeout:
+                        self.logger.info(f"Closing idle stream for camera {camera_number}")
+                        self.close(camera_number)
+
+    def close_all(self, timeout=3):
+        self.stop_event.set()
+        with self.lock:
+            streams = list(self.streams.values())
+            for camera_number in list(self.streams):
+                self.close(camera_number)
+            self.active = None
+        # Fora do lock: espera os processos de captura saírem e a memória compartilhada ser liberada
+        deadline = time.monotonic() + timeout
+        for stream in streams:
+            if stream.worker is not None:
+                stream.worker.join(max(0, deadline - time.monotonic()))
@@ -0,0 +1,161 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import Counter, defaultdict
+from config import SUPPRESSION_WINDOWS
+from logger import get_logger
+
+HOLD = "hold"
+DROP = "drop"
+ALL_CAMERAS = "*"
+
+class Rule:
+    __slots__ = ("camera", "expires", "action")
+
+    def __init__(self, camera, expires, action):
+        self.camera = camera
+        self.expires = expires
+        self.action = action
+
+class TimeWindow:
+    __slots__ = ("camera", "start", "end", "action", "release_at")
+
+    def __init__(self, camera, start, end, action):
+        self.camera = camera
+        self.start = self.minutes(start)
+        self.end = self.minutes(end)
+        self.action = action
+        self.release_at = None
+
+    @staticmethod
+    def minutes(value):
+        hours, minutes = value.split(":")
+        return int(hours) * 60 + int(minutes)
+
+    def active(self, now):
+        local = time.localtime(now)
+        current = local.tm_hour * 60 + local.tm_min
+        if self.start <= self.end:
+            return self.start <= current < self.end
+        return current >= self.start or current < self.end  # Atravessa a meia-noite
+
+    def ends_at(self, now):
+        local = time.localtime(now)
+        current = local.tm_hour * 60 + local.tm_min
+        remaining = (self.end - current) % (24 * 60)
+        return now - local.tm_sec + remaining * 60
+
+class SuppressionRules:
+    def __init__(self, on_release, on_drop, windows=SUPPRESSION_WINDOWS):
+        self.on_release = on_release
+        self.on_drop = on_drop
+        self.logger = get_logger()
+        # Regras indexadas por câmera; vencimentos em um heap
+        self.inhibits = {}
+        self.pause = None
+        self.windows = defaultdict(list)
+        for camera, start, end, action in windows:
+            self.windows[camera].append(TimeWindow(camera, start, end, action))
+        self.expiry = []
+        self.counter = itertools.count()
+        self.held = defaultdict(list)
+        self.suppressed = Counter()
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        threading.Thread(target=self.expire_loop, daemon=True).start()
+
+    def schedule(self, expires, rule):
+        heapq.heappush(self.expiry, (expires, next(self.counter), rule))
+        self.wake.set()
+
+    def supersede(self, old, rule):
+        # Os retidos pela regra substituída passam para a nova; se ela descarta, são descartados
+        held = self.held.pop(old, None) if old is not None else None
+        if not held:
+            return []
+        if rule.action == HOLD:
+            self.held[rule].extend(held)
+            return []
+        return held
+
+    def inhibit(self, camera, seconds, action=DROP):
+        with self.lock:
+            rule = Rule(camera, time.time() + seconds, action)
+            dropped = self.supersede(self.inhibits.get(camera), rule)
+            self.inhibits[camera] = rule
+            self.schedule(rule.expires, rule)
+        self.logger.info(f"Detections from {camera} inhibited for {seconds}s ({action})")
+        if dropped:
+            self.on_drop(dropped)
+
+    def pause_all(self, seconds, action=HOLD):
+        with self.lock:
+            rule = Rule(ALL_CAMERAS, time.time() + seconds, action)
+            dropped = self.supersede(self.pause, rule)
+            self.pause = rule
+            self.schedule(rule.expires, rule)
+        self.logger.info(f"Detections paused for {seconds}s ({action})")
+        if dropped:
+            self.on_drop(dropped)
+
+    def match(self, event, now):
+        if self.pause is not None and self.pause.expires > now:
+            return self.pause
+        rule = self.inhibits.get(event.camera_name)
+        if rule is not None and rule.expires > now:
+            return rule
+        for camera in (event.camera_name, ALL_CAMERAS):
+            for window in self.windows.get(camera, ()):
+                if window.active(now):
+                    return window
+        return None
+
+    def admit(self, event):
+        # Retorna True se o evento segue para a fila
+        now = time.time()
+        with self.lock:
+            rule = self.match(event, now)
+            if rule is None:
+                return True
+            self.suppressed[event.camera_name] += 1
+            if rule.action == HOLD:
+                self.held[rule].append(event)
+                if isinstance(rule, TimeWindow) and rule.release_at is None:
+                    rule.release_at = rule.ends_at(now)
+                    self.schedule(rule.release_at, rule)
+                return False
+        self.on_drop([event])
+        return False
+
+    def expire(self, now):
+        released = []
+        with self.lock:
+            while self.expiry and self.expiry[0][0] <= now:
+                expires, _, rule = heapq.heappop(self.expiry)
+                if isinstance(rule, TimeWindow):
+                    if rule.release_at != expires:
+                        continue
+                    rule.release_at = None
+                elif rule is self.pause:
+                    self.pause = None
+                elif self.inhibits.get(rule.camera) is rule:
+                    del self.inhibits[rule.camera]
+                else:
+                    continue  # Regra substituída antes de vencer
+                released.extend(self.held.pop(rule, ()))
+        if released:
+            self.logger.info(f"Releasing {len(released)} held events")
+            self.on_release(released)
+
+    def expire_loop(self):
+        while True:
+            with self.lock:
+                timeout = self.expiry[0][0] - time.time() if self.expiry else None
+            self.wake.wait(None if timeout is None else max(0, timeout))
+            self.wake.clear()
+            self.expire(time.time())
+
+    def stats(self):
+        with self.lock:
+            return {"suppressed": dict(self.suppressed), "held": sum(len(events) for events in self.held.values())}
@@ -1,47 +1,342 @@
 import cv2
 import numpy as np
+import random
 import threading
+import time
+from contextlib import contextmanager
+from config import RING_SECONDS, RING_JPEG_QUALITY, DISPLAY_FPS, PREVIEW_QUALITY, STREAM_BACKEND, CAPTURE_PROCESSES, STREAM_OPEN_TIMEOUT, STREAM_READ_TIMEOUT, STREAM_BACKOFF_BASE, STREAM_BACKOFF_MAX
+from frame_ring import FrameRing
 from logger import get_logger
+from metrics import get_metrics
+from mjpeg_reader import MjpegReader
 from PIL import Image, ImageTk
 
+REDUCED_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+CONNECTING = "connecting"
+STREAMING = "streaming"
+STALLED = "stalled"
+BACKING_OFF = "backing off"
+CLOSED = "closed"
+STATES = (CONNECTING, STREAMING, STALLED, BACKING_OFF, CLOSED)
+
 class VideoStream:
-    def __init__(self, label, url):
+    def __init__(self, label, url, display_fps=DISPLAY_FPS, preview_quality=PREVIEW_QUALITY, backend=STREAM_BACKEND, out_of_process=CAPTURE_PROCESSES):
         self.label = label
         self.url = url
+        self.backend = backend
+        self.out_of_process = out_of_process
+        # Com captura em processo separado, os quadros chegam por memória compartilhada
+        self.worker = None
         self.logger = get_logger()
+        self.metrics = get_metrics()
         self.running = False
+        self.state = CLOSED
+        self.stop_event = threading.Event()
+        self.reconnects = 0
+        self.last_frame_time = None
+        self.fps = 0.0
+        self.fps_frames = 0
+        self.fps_started = time.monotonic()
         self.frame = None
+        self.preview_quality = preview_quality
+        self.decode_scale = 2
+        # Tamanho do label, lido no loop do Tk e usado pela thread de captura
+        self._target_size = None
+        self.scaled = None
+        self.back = None
+        # Buffer de um único quadro: a captura sobrescreve, a interface consome
+        self.frame_lock = threading.Lock()
+        self.frame_seq = 0
+        self.displayed_seq = 0
+        self.frames_displayed = 0
+        self.frames_dropped = 0
+        self.photo = None
+        self.refresh_interval = max(1, int(1000 / display_fps))
+        self.after_id = None
+        # Quadros recentes em JPEG; no modo em processo separado ficariam no outro processo
+        self.ring = FrameRing() if RING_SECONDS and not out_of_process else None
+        self.encode_ring = False
+        self.scrubbing = False
 
     def start(self):
         self.running = True
-        threading.Thread(target=self.update, daemon=True).start()
-        self.logger.info("Video stream started")
+        self.stop_event.clear()
+        if self.out_of_process:
+            from capture_worker import CaptureWorker
+            self.worker = CaptureWorker(self)
+            self.worker.start()
+        else:
+            threading.Thread(target=self.update, name="capture", daemon=True).start()
+        if self.label is not None:
+            self.refresh()
+        self.logger.info(f"Video stream started: {self.url}")
 
-    def update(self):
-        try:
-            cap = cv2.VideoCapture(self.url)
-            if not cap.isOpened():
-                self.logger.error(f"Failed to open video stream: {self.url}")
-                self.running = False
-                return
-            while self.running:
-                ret, frame = cap.read()
-                if ret:
-                    self.frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    img = Image.fromarray(self.frame)
-                    imgtk = ImageTk.PhotoImage(image=img)
-                    self.label.configure(image=imgtk)
-                    self.label.image = imgtk
-                else:
-                    self.logger.warning("No frame received from stream")
+    def attach(self, label):
+        # Chamado no loop do Tk; reaproveita a captura já aberta
+        self.detach()
+        self.label = label
+        self.photo = None
+        self.scrubbing = False
+        with self.latest_frame() as (_, seq):
+            self.displayed_seq = max(0, seq - 1)
+        self.refresh()
+
+    @property
+    def target_size(self):
+        return self._target_size
+
+    @target_size.setter
+    def target_size(self, size):
+        self._target_size = size
+        if self.worker is not None:
+            self.worker.set_target(size)
+
+    @contextmanager
+    def latest_frame(self):
+        # (quadro, seq) mais recente; o quadro só é válido dentro do bloco
+        if self.worker is not None:
+            yield self.worker.latest()
+        else:
+            with self.frame_lock:
+                yield self.frame, self.frame_seq
+
+    def intact(self, seq):
+        # Confere, depois da cópia, se o quadro seq não foi sobrescrito durante ela
+        return self.worker is None or self.worker.intact(seq)
+
+    def detach(self):
+        if self.after_id is not None:
+            self.label.after_cancel(self.after_id)
+            self.after_id = None
+        self.label = None
+
+    def set_state(self, state):
+        if state != self.state:
+            self.state = state
+            self.logger.info(f"Stream {self.url}: {state}")
+
+    def open_capture(self):
+        # Retorna a captura e a função de leitura que devolve (ret, frame)
+        self.encode_ring = False
+        if self.backend == "mjpeg":
+            cap = MjpegReader(self.url, on_frame=self.record_jpeg if self.ring is not None else None)
+            if not cap.open():
+                return None, None
+            if self.preview_quality:
+                return cap, lambda: self.adapt_decode_scale(cap.read(self.decode_flag())[1])
+            return cap, cap.read
+        params = [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, STREAM_OPEN_TIMEOUT * 1000, cv2.CAP_PROP_READ_TIMEOUT_MSEC, STREAM_READ_TIMEOUT * 1000]
+        cap = cv2.VideoCapture(self.url, cv2.CAP_ANY, params)
+        if not cap.isOpened():
+            self.logger.error(f"Failed to open video stream: {self.url}")
             cap.release()
-        except Exception as e:
-            self.logger.error(f"Error in video stream: {e}")
-            self.running = False
-        finally:
-            if 'cap' in locals():
-                cap.release()
+            return None, None
+        if self.preview_quality or self.ring is not None:
+            # Pacotes JPEG crus: o anel copia o que chega, também nos streams pré-aquecidos
+            if cap.set(cv2.CAP_PROP_FORMAT, -1):
+                return cap, lambda: self.read_reduced(cap)
+            self.logger.warning("Raw packets not supported by capture backend, decoding in the backend")
+        # Sem acesso ao JPEG original: o quadro reduzido é recodificado para o anel, só no stream em exibição
+        self.encode_ring = self.ring is not None
+        return cap, cap.read
+
+    def backoff(self, attempt):
+        self.set_state(BACKING_OFF)
+        delay = min(STREAM_BACKOFF_MAX, STREAM_BACKOFF_BASE * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+        self.stop_event.wait(delay)
+
+    def update(self):
+        attempt = 0
+        while self.running:
+            self.set_state(CONNECTING)
+            try:
+                with self.metrics.timer("stream_open"):
+                    cap, read = self.open_capture()
+                if cap is not None:
+                    try:
+                        if self.read_frames(read):
+                            attempt = 0
+                    finally:
+                        cap.release()
+            except Exception as e:
+                self.logger.error(f"Error in video stream: {e}")
+            if not self.running:
+                break
+            attempt += 1
+            self.reconnects += 1
+            self.metrics.increment("stream_reconnects")
+            self.backoff(attempt)
+        self.set_state(CLOSED)
+
+    def read_frames(self, read):
+        # Retorna True se chegou a receber quadros antes de cair
+        received = False
+        stalled_since = None
+        while self.running:
+            ret, frame = read()
+            if ret:
+                received = True
+                stalled_since = None
+                self.set_state(STREAMING)
+                self.publish(frame)
+                continue
+            now = time.monotonic()
+            if stalled_since is None:
+                stalled_since = now
+                self.set_state(STALLED)
+                self.logger.warning("No frame received from stream")
+            if now - stalled_since > STREAM_READ_TIMEOUT:
+                self.logger.warning(f"Stream {self.url} stalled for {STREAM_READ_TIMEOUT}s, reconnecting")
+                return received
+            # Evita girar em falso enquanto a câmera não responde
+            self.stop_event.wait(0.1)
+        return received
+
+    def decode_flag(self):
+        return REDUCED_DECODE_FLAGS[self.decode_scale]
+
+    def read_reduced(self, cap):
+        # Modo bruto do cv2: cada leitura devolve o pacote JPEG ainda codificado
+        ret, packet = cap.read()
+        if ret and self.ring is not None:
+            self.record_jpeg(packet)
+        if not self.preview_quality:
+            frame = cv2.imdecode(packet, cv2.IMREAD_COLOR) if ret else None
+            return frame is not None, frame
+        return self.adapt_decode_scale(cv2.imdecode(packet, self.decode_flag()) if ret else None)
+
+    def adapt_decode_scale(self, frame):
+        if frame is not None and self.target_size:
+            # Maior redução que ainda cobre o tamanho do label
+            height, width = frame.shape[:2]
+            full_width, full_height = width * self.decode_scale, height * self.decode_scale
+            target_width, target_height = self.target_size
+            self.decode_scale = max(scale for scale in REDUCED_DECODE_FLAGS
+                                    if scale == 1 or (full_width // scale >= target_width and full_height // scale >= target_height))
+        return frame is not None, frame
+
+    def scale(self, frame, target_size):
+        height, width = frame.shape[:2]
+        size = (width, height)
+        if target_size:
+            target_width, target_height = target_size
+            scale = min(1.0, target_width / width, target_height / height)
+            size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        if size != (width, height):
+            shape = (size[1], size[0], 3)
+            if self.scaled is None or self.scaled.shape != shape:
+                self.scaled = np.empty(shape, dtype=np.uint8)
+            cv2.resize(frame, size, dst=self.scaled, interpolation=cv2.INTER_AREA)
+            frame = self.scaled
+        return frame
+
+    def record_jpeg(self, data):
+        self.ring.append(data)
+
+    def publish(self, frame):
+        frame = self.scale(frame, self.target_size)
+        # Recodificar custa um imencode por quadro: só para o stream em exibição, não para os pré-aquecidos
+        if self.encode_ring and self.label is not None:
+            ret, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, RING_JPEG_QUALITY])
+            if ret:
+                self.record_jpeg(jpeg)
+        if self.back is None or self.back.shape != frame.shape:
+            self.back = np.empty(frame.shape, dtype=np.uint8)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self.back)
+        with self.frame_lock:
+            self.frame, self.back = self.back, self.frame
+            self.frame_seq += 1
+        self.count_frame()
+
+    def count_frame(self):
+        now = time.monotonic()
+        self.last_frame_time = now
+        self.fps_frames += 1
+        if now - self.fps_started >= 1.0:
+            self.fps = self.fps_frames / (now - self.fps_started)
+            self.fps_frames = 0
+            self.fps_started = now
+
+    def refresh(self):
+        # Executa no loop do Tk; quadros que chegaram entre dois ticks são descartados
+        if not self.running or self.label is None:
+            return
+        width, height = self.label.winfo_width(), self.label.winfo_height()
+        if width > 1 and height > 1 and self.target_size != (width, height):
+            self.target_size = (width, height)
+        with self.latest_frame() as (frame, seq):
+            # O buffer exibido só é reutilizado pela captura depois de liberar o lock
+            if frame is not None and seq != self.displayed_seq and not self.scrubbing:
+                self.frames_dropped += max(0, seq - self.displayed_seq - 1)
+                self.displayed_seq = seq
+                self.show(frame)
+                if not self.intact(seq):
+                    self.displayed_seq = seq - 1  # Sobrescrito durante a cópia; reexibe no próximo tick
+        self.after_id = self.label.after(self.refresh_interval, self.refresh)
+
+    def recorded_span(self):
+        # (primeiro, último) horário gravado no anel, ou None
+        return self.ring.span() if self.ring is not None else None
+
+    def show_recorded(self, timestamp):
+        # Chamado no loop do Tk; só o quadro pedido é decodificado. Retorna o horário do quadro exibido
+        if self.ring is None or self.label is None:
+            return None
+        found = self.ring.nearest(timestamp)
+        if found is None:
+            return None
+        captured, jpeg = found
+        frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            return None
+        if self.target_size:
+            height, width = frame.shape[:2]
+            scale = min(1.0, self.target_size[0] / width, self.target_size[1] / height)
+            if scale < 1.0:
+                frame = cv2.resize(frame, (max(1, int(width * scale)), max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+        self.scrubbing = True
+        self.show(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        return captured
+
+    def resume_live(self):
+        self.scrubbing = False
+        self.displayed_seq = max(0, self.displayed_seq - 1)
+
+    def show(self, frame):
+        img = Image.fromarray(frame)
+        if self.photo is None or (self.photo.width(), self.photo.height()) != img.size:
+            self.photo = ImageTk.PhotoImage(image=img)
+            self.label.configure(image=self.photo)
+            self.label.image = self.photo
+        else:
+            self.photo.paste(img)
+        self.frames_displayed += 1
+
+    def stats(self):
+        state, fps, reconnects, last_frame_time, received = self.state, self.fps, self.reconnects, self.last_frame_time, self.frame_seq
+        if self.worker is not None:
+            state, fps, reconnects, last_frame_time, received = self.worker.status()
+        since_last = time.monotonic() - last_frame_time if last_frame_time else None
+        return {
+            "state": state,
+            "fps": round(fps, 1) if since_last is not None and since_last < 2 else 0.0,
+            "reconnects": reconnects,
+            "seconds_since_last_frame": since_last,
+            "displayed": self.frames_displayed,
+            "dropped": self.frames_dropped,
+            "received": received,
+        }
 
     def stop(self):
         self.running = False
-        self.logger.info("Video stream stopped")
\ No newline at end of file
+        self.stop_event.set()
+        self.detach()
+        if self.worker is not None:
+            self.worker.stop()
+        self.logger.info(f"Video stream stopped ({self.frames_displayed} displayed, {self.frames_dropped} dropped)")
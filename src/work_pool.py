@@ -0,0 +1,322 @@
+import json
+import math
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from config import LEASE_TTL, LEASE_SWEEP_INTERVAL, REBALANCE_SLACK
+from logger import get_logger
+
+LEASE_SUFFIX = ".lease"
+
+def read_lease(lease):
+    # (estação, token) gravados no lease, ou None se ele não existe
+    try:
+        with open(lease, "r", encoding="utf-8") as f:
+            owner, _, token = f.read().partition("\n")
+    except OSError:
+        return None
+    return owner, token
+
+def create_exclusive(tmp_path, path):
+    # Rename/link atômico que falha se o destino já existe
+    try:
+        if os.name == "nt":
+            os.rename(tmp_path, path)
+        else:
+            os.link(tmp_path, path)
+            os.remove(tmp_path)
+        return True
+    except FileExistsError:
+        os.remove(tmp_path)
+        return False
+
+class WorkPool:
+    def __init__(self, path, station_id=None, depth=None, on_claimed=None, give_back=None, on_lost=None, lease_ttl=LEASE_TTL, interval=LEASE_SWEEP_INTERVAL):
+        self.path = path
+        self.station_id = station_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.depth = depth or (lambda: len(self.owned))
+        self.on_claimed = on_claimed
+        self.give_back = give_back
+        self.on_lost = on_lost
+        self.lease_ttl = lease_ttl
+        self.interval = interval
+        self.logger = get_logger()
+        self.lease_dir = os.path.join(path, ".leases")
+        self.station_dir = os.path.join(path, ".stations")
+        self.owned = set()
+        self.unclaimed = set()
+        self.fair_share = None
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+    def lease_path(self, filename):
+        return os.path.join(self.lease_dir, filename + LEASE_SUFFIX)
+
+    def start(self):
+        os.makedirs(self.lease_dir, exist_ok=True)
+        os.makedirs(self.station_dir, exist_ok=True)
+        self.heartbeat()
+        self.rebalance()
+        threading.Thread(target=self.loop, daemon=True).start()
+        self.logger.info(f"Work pool started as station {self.station_id}: {self.path}")
+
+    def stop(self):
+        self.stop_event.set()
+        with self.lock:
+            owned = list(self.owned)
+        for filename in owned:
+            self.release(filename)
+        try:
+            os.remove(os.path.join(self.station_dir, self.station_id + ".json"))
+        except OSError:
+            pass
+
+    def wants_more(self):
+        return self.fair_share is None or self.depth() < self.fair_share + REBALANCE_SLACK
+
+    def claim(self, path):
+        filename = os.path.basename(path)
+        with self.lock:
+            if filename in self.owned:
+                return True
+        if not self.wants_more() or not self.try_lease(filename):
+            with self.lock:
+                self.unclaimed.add(filename)
+            return False
+        with self.lock:
+            self.owned.add(filename)
+            self.unclaimed.discard(filename)
+        return True
+
+    def write_tmp(self, content):
+        tmp_path = os.path.join(self.lease_dir, f".{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        return tmp_path
+
+    def expired(self, lease):
+        try:
+            return time.time() - os.stat(lease).st_mtime > self.lease_ttl
+        except FileNotFoundError:
+            return True
+
+    def try_lease(self, filename):
+        lease = self.lease_path(filename)
+        current = read_lease(lease)
+        # Cada escrita do lease leva um token novo: "estação\ntoken"
+        content = f"{self.station_id}\n{uuid.uuid4().hex}"
+        if current is None:
+            return create_exclusive(self.write_tmp(content), lease)
+        if not self.expired(lease):
+            return False
+        # Tomada de um lease vencido: só uma estação cria o marcador do token observado,
+        # e o lease é trocado por os.replace, sem janela em que o caminho fica livre
+        marker = f"{lease}.{current[1]}"
+        if not create_exclusive(self.write_tmp(self.station_id), marker):
+            self.clear_abandoned(marker)
+            return False
+        try:
+            # O dono pode ter renovado, ou outra estação já ter trocado o lease, desde a primeira leitura
+            if read_lease(lease) != current or not self.expired(lease):
+                return False
+            os.replace(self.write_tmp(content), lease)
+            return True
+        except OSError:
+            return False
+        finally:
+            try:
+                os.remove(marker)
+            except OSError:
+                pass
+
+    def clear_abandoned(self, marker):
+        # Marcador de uma estação que caiu no meio da tomada; sem isso o lease ficaria preso
+        try:
+            if time.time() - os.stat(marker).st_mtime <= self.lease_ttl:
+                return
+            stale = f"{marker}.{uuid.uuid4().hex}.stale"
+            os.rename(marker, stale)
+            if time.time() - os.stat(stale).st_mtime <= self.lease_ttl:
+                # Entre o stat e o rename o marcador foi recriado; devolve
+                create_exclusive(stale, marker)
+            else:
+                os.remove(stale)
+        except OSError:
+            pass
+
+    def owns(self, lease):
+        current = read_lease(lease)
+        return current is not None and current[0] == self.station_id
+
+    def release(self, filename):
+        with self.lock:
+            self.owned.discard(filename)
+        lease = self.lease_path(filename)
+        if self.owns(lease):
+            try:
+                os.remove(lease)
+            except OSError as e:
+                self.logger.error(f"Error releasing lease {lease}: {e}")
+
+    def complete(self, paths):
+        for path in paths:
+            self.release(os.path.basename(path))
+
+    def hand_back(self, paths):
+        # Libera eventos ainda não tratados: voltam ao pool para esta ou outra estação
+        for path in paths:
+            filename = os.path.basename(path)
+            self.release(filename)
+            with self.lock:
+                self.unclaimed.add(filename)
+
+    def heartbeat(self):
+        tmp_path = os.path.join(self.station_dir, f".{self.station_id}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"depth": self.depth(), "updated": time.time()}, f)
+        os.replace(tmp_path, os.path.join(self.station_dir, self.station_id + ".json"))
+
+    def renew(self):
+        with self.lock:
+            owned = list(self.owned)
+        lost = []
+        for filename in owned:
+            lease = self.lease_path(filename)
+            if not self.owns(lease):
+                lost.append(filename)
+                continue
+            try:
+                os.utime(lease)
+            except FileNotFoundError:
+                lost.append(filename)
+        if not lost:
+            return
+        # Lease perdido (expirou e foi tomado); o evento deixa de ser nosso
+        self.logger.warning(f"Leases lost: {', '.join(lost)}")
+        with self.lock:
+            self.owned.difference_update(lost)
+        if self.on_lost:
+            self.on_lost([os.path.join(self.path, filename) for filename in lost])
+
+    def rebalance(self):
+        depths = []
+        now = time.time()
+        with os.scandir(self.station_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    with open(entry.path, "r", encoding="utf-8") as f:
+                        station = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                if now - station["updated"] <= self.lease_ttl:
+                    depths.append(station["depth"])
+        if not depths:
+            return
+        self.fair_share = math.ceil(sum(depths) / len(depths))
+        excess = self.depth() - self.fair_share - REBALANCE_SLACK
+        if excess > 0 and self.give_back:
+            # Devolve ao pool os eventos de menor prioridade ainda não exibidos
+            paths = self.give_back(excess)
+            self.hand_back(paths)
+            if paths:
+                self.logger.info(f"Returned {len(paths)} events to the pool (fair share {self.fair_share})")
+
+    def sweep(self):
+        with self.lock:
+            # DEF primeiro, depois os mais antigos (o nome começa pela data)
+            candidates = sorted(self.unclaimed, key=lambda name: ("[ DEF ]" not in name, name))
+        if not candidates:
+            return
+        present = {entry.name for entry in os.scandir(self.path)}
+        for filename in candidates:
+            if filename not in present:
+                with self.lock:
+                    self.unclaimed.discard(filename)
+                continue
+            if not self.wants_more():
+                break
+            path = os.path.join(self.path, filename)
+            if self.claim(path) and self.on_claimed:
+                self.on_claimed(path)
+
+    def loop(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.heartbeat()
+                self.renew()
+                self.rebalance()
+                self.sweep()
+            except OSError as e:
+                self.logger.error(f"Error in work pool maintenance: {e}")
+
+def simulate_station(path, station_id, handle_seconds, results, lease_ttl=2, duration=5):
+    # Estação simulada: reivindica arquivos e os "trata" apagando após um tempo
+    pending = []
+
+    def lost(paths):
+        for lost_path in paths:
+            if lost_path in pending:
+                pending.remove(lost_path)
+
+    pool = WorkPool(path, station_id, depth=lambda: len(pending), on_claimed=pending.append, on_lost=lost, interval=0.2, lease_ttl=lease_ttl)
+    pool.start()
+    deadline = time.time() + duration
+    while time.time() < deadline:
+        for entry in os.scandir(path):
+            if entry.is_file() and entry.path not in pending and pool.claim(entry.path):
+                pending.append(entry.path)
+        if pending:
+            handled = pending.pop(0)
+            time.sleep(handle_seconds)
+            try:
+                os.remove(handled)
+                results.append((station_id, os.path.basename(handled)))
+            except FileNotFoundError:
+                results.append((station_id, "DUPLICATE " + os.path.basename(handled)))
+            pool.complete([handled])
+        else:
+            time.sleep(0.05)
+    pool.stop()
+
+def crash_station(path, station_id, lease_ttl=2):
+    # Estação que reivindica tudo e cai sem liberar nada: os leases só saem por vencimento
+    pool = WorkPool(path, station_id, depth=lambda: 0, lease_ttl=lease_ttl)
+    pool.start()
+    for entry in os.scandir(path):
+        if entry.is_file():
+            pool.claim(entry.path)
+    os._exit(1)
+
+def simulate(folder, stations, results, crash=False, lease_ttl=2, duration=5):
+    import multiprocessing
+    if crash:
+        crashed = multiprocessing.Process(target=crash_station, args=(folder, "crashed", lease_ttl))
+        crashed.start()
+        crashed.join()
+    workers = [multiprocessing.Process(target=simulate_station, args=(folder, f"station{n}", 0.01 * (n + 1), results, lease_ttl, duration)) for n in range(stations)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+if __name__ == "__main__":
+    import multiprocessing
+    import tempfile
+    stations = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    crash = "--crash" in sys.argv
+    folder = tempfile.mkdtemp()
+    for i in range(60):
+        open(os.path.join(folder, f"{i:04d}.jpg"), "w").close()
+    with multiprocessing.Manager() as manager:
+        results = manager.list()
+        simulate(folder, stations, results, crash)
+        handled = list(results)
+    for n in range(stations):
+        print(f"station{n}: {sum(1 for station, _ in handled if station == f'station{n}')} events")
+    duplicates = [name for _, name in handled if name.startswith("DUPLICATE")]
+    print(f"handled {len(handled)} of 60, duplicates: {len(duplicates)}")
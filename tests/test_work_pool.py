@@ -0,0 +1,111 @@
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from bursts import BurstGrouper
+from camera_map import CameraMap
+from file_actions import DELETE
+from pipeline import EventPipeline
+from work_pool import WorkPool, read_lease, simulate
+
+def take_over(folder, station_id, barrier, results):
+    pool = WorkPool(folder, station_id, lease_ttl=1)
+    os.makedirs(pool.lease_dir, exist_ok=True)
+    barrier.wait()
+    results.append((station_id, pool.try_lease("0000.jpg")))
+
+def test_expired_lease_has_one_new_owner(tmp_path):
+    folder = str(tmp_path)
+    pool = WorkPool(folder, "crashed", lease_ttl=1)
+    os.makedirs(pool.lease_dir)
+    assert pool.try_lease("0000.jpg")
+    past = time.time() - 10
+    os.utime(pool.lease_path("0000.jpg"), (past, past))
+    with multiprocessing.Manager() as manager:
+        barrier = manager.Barrier(6)
+        results = manager.list()
+        workers = [multiprocessing.Process(target=take_over, args=(folder, f"station{n}", barrier, results)) for n in range(6)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        winners = [station for station, won in results if won]
+    assert len(winners) == 1
+    assert pool.owns(pool.lease_path("0000.jpg")) is False
+    with open(pool.lease_path("0000.jpg"), encoding="utf-8") as f:
+        assert f.read().split("\n")[0] == winners[0]
+
+def test_crashed_station_events_are_handled_once(tmp_path):
+    folder = str(tmp_path)
+    for i in range(30):
+        open(os.path.join(folder, f"{i:04d}.jpg"), "w").close()
+    with multiprocessing.Manager() as manager:
+        results = manager.list()
+        simulate(folder, 3, results, crash=True, lease_ttl=1, duration=4)
+        handled = [name for _, name in results]
+    assert not [name for name in handled if name.startswith("DUPLICATE")]
+    assert Counter(handled) == Counter(f"{i:04d}.jpg" for i in range(30))
+
+def burst_pipeline(tmp_path):
+    # Líder e dois membros da mesma câmera, todos com lease desta estação
+    folder = tmp_path / "pool"
+    folder.mkdir()
+    paths = []
+    for i in range(3):
+        path = folder / f"20240101-00000{i}_10.0.0.1_Cam01_000{i}.jpg"
+        path.write_bytes(b"")
+        paths.append(str(path))
+    pipeline = EventPipeline((64, 36), CameraMap(cache_path=str(tmp_path / "camera_map.json")), pool_path=str(folder), journal_path=str(tmp_path / "events.db"), archive_path=str(tmp_path / "arquivo"), action_journal=str(tmp_path / "actions.journal"))
+    pipeline.bursts = BurstGrouper(max_distance=None)
+    pipeline.start()
+    for path in paths:
+        pipeline.enqueue_image(path)
+    assert len(pipeline.image_queue) == 1
+    return pipeline, paths
+
+def steal(pipeline, path):
+    with open(pipeline.work_pool.lease_path(os.path.basename(path)), "w", encoding="utf-8") as f:
+        f.write("other\ntoken")
+
+def test_lost_leader_hands_back_members(tmp_path):
+    pipeline, (leader, *members) = burst_pipeline(tmp_path)
+    try:
+        steal(pipeline, leader)
+        pipeline.work_pool.renew()
+        assert pipeline.image_queue.empty()
+        assert read_lease(pipeline.work_pool.lease_path(os.path.basename(leader)))[0] == "other"
+        for member in members:
+            assert read_lease(pipeline.work_pool.lease_path(os.path.basename(member))) is None
+            assert os.path.basename(member) in pipeline.work_pool.unclaimed
+    finally:
+        pipeline.close()
+
+def test_lost_displayed_leader_hands_back_members(tmp_path):
+    pipeline, (leader, *members) = burst_pipeline(tmp_path)
+    pipeline.on_current_lost = pipeline.skip
+    try:
+        assert pipeline.next_event().path == leader
+        steal(pipeline, leader)
+        pipeline.work_pool.renew()
+        assert pipeline.current is None
+        for member in members:
+            assert read_lease(pipeline.work_pool.lease_path(os.path.basename(member))) is None
+    finally:
+        pipeline.close()
+
+def test_lost_member_is_not_handled_with_its_burst(tmp_path):
+    pipeline, (leader, lost, member) = burst_pipeline(tmp_path)
+    try:
+        steal(pipeline, lost)
+        pipeline.work_pool.renew()
+        assert pipeline.next_event().path == leader
+        assert [event.path for event in pipeline.resolve(DELETE)] == [leader, member]
+    finally:
+        pipeline.close()
+    assert os.path.exists(lost)
+    assert not os.path.exists(leader) and not os.path.exists(member)
+    assert read_lease(pipeline.work_pool.lease_path(os.path.basename(lost)))[0] == "other"